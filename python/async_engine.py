@@ -0,0 +1,295 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from rate_limit import AdaptiveController, RetryPolicy, is_overload_status, parse_retry_after
+from run_metrics import metrics
+
+try:
+    import aiohttp
+except ImportError:  # Only needed for --engine asyncio
+    aiohttp = None
+
+# Concurrent downloads allowed against each resume host (manager.pocketful.in)
+RESUME_HOST_LIMIT = 64
+# Concurrent calls allowed against the analysis webhook
+WEBHOOK_LIMIT = 32
+# Applications being worked on at once
+MAX_IN_FLIGHT = 200
+
+
+class AsyncEngine:
+    """
+    asyncio implementation of the download -> parse -> analyze flow.
+
+    All HTTP goes through one aiohttp session with keep-alive connections.
+    Resume hosts get a semaphore each, while the analysis webhook goes
+    through an AdaptiveController, so a slow webhook cannot starve downloads
+    and vice versa. PDF parsing is handed to `parse_pool`, and results go to
+    `on_result` exactly like the threaded pipeline, so the checkpoint output
+    is the same.
+    """
+
+    def __init__(self, api_url, cache, parse_fn, build_input, parse_output, parse_pool,
+                 resume_limit=RESUME_HOST_LIMIT, webhook_limit=WEBHOOK_LIMIT, max_in_flight=MAX_IN_FLIGHT,
+                 webhook_limiter=None, retry_policy=None, max_overload_wait=30 * 60, batcher=None,
+                 dedupe=None, prepare_text=None, local_extractor=None, record_parse=None, parse_workers=None):
+        if aiohttp is None:
+            raise RuntimeError("The asyncio engine needs aiohttp: pip install aiohttp")
+        self.api_url = api_url
+        self.cache = cache
+        self.parse_fn = parse_fn
+        self.build_input = build_input
+        self.parse_output = parse_output
+        self.parse_pool = parse_pool
+        self.resume_limit = resume_limit
+        self.webhook_limit = webhook_limit
+        self.max_in_flight = max_in_flight
+        self.webhook_limiter = webhook_limiter or AdaptiveController(
+            'Analysis API', initial_limit=webhook_limit, max_limit=webhook_limit)
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=3, base_delay=2, max_delay=60)
+        self.max_overload_wait = max_overload_wait
+        self.batcher = batcher
+        self.dedupe = dedupe
+        self.prepare_text = prepare_text
+        self.local_extractor = local_extractor
+        # parse_fn takes a cached PDF's path and returns (text, pages, seconds) when record_parse is given
+        self.record_parse = record_parse
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self._host_limits = None
+
+    async def _download(self, session, url):
+        # Pinned until extract_text has the text, so eviction cannot remove the PDF first
+        sha, is_fresh = self.cache.lookup(url, pin=True)
+        if is_fresh:
+            return sha
+
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        headers.update(self.cache.conditional_headers(url))
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with self._host_limits[urlsplit(url).netloc]:
+            start = time.monotonic()
+            async with session.get(url, headers=headers, timeout=timeout) as response:
+                if response.status == 304:
+                    sha = self.cache.mark_not_modified(url, pin=True)
+                    if sha:
+                        return sha
+                    headers.pop('If-None-Match', None)
+                    headers.pop('If-Modified-Since', None)
+                    async with session.get(url, headers=headers, timeout=timeout) as retry:
+                        retry.raise_for_status()
+                        content = await retry.read()
+                        response_headers = retry.headers
+                else:
+                    response.raise_for_status()
+                    content = await response.read()
+                    response_headers = response.headers
+            metrics.observe('download_seconds', time.monotonic() - start)
+        return await asyncio.to_thread(self.cache.store, url, content, response_headers, True)
+
+    async def download_resume(self, session, url):
+        start = time.monotonic()
+        try:
+            return await self._download_with_retries(session, url)
+        finally:
+            metrics.inc('stage_busy_seconds', time.monotonic() - start, stage='download')
+            metrics.inc('stage_items_total', stage='download')
+
+    async def _download_with_retries(self, session, url):
+        max_retries = self.retry_policy.max_attempts
+        for attempt in range(max_retries):
+            try:
+                return await self._download(session, url)
+            except Exception as e:
+                print(f"  Error downloading PDF from {url} (Attempt {attempt+1}/{max_retries}): {e}")
+                if attempt < max_retries - 1:
+                    metrics.inc('download_retries_total')
+                    headers = getattr(e, 'headers', None)
+                    retry_after = parse_retry_after(headers.get('Retry-After')) if headers else None
+                    await asyncio.sleep(self.retry_policy.backoff(attempt, retry_after))
+        metrics.inc('download_failures_total')
+        return None
+
+    async def extract_text(self, session, sha, url):
+        try:
+            return await self._extract_text(sha, url)
+        finally:
+            # Downloads pin the PDF; it may be evicted once the text is cached
+            self.cache.unpin(sha)
+
+    async def _extract_text(self, sha, url):
+        text = await asyncio.to_thread(self.cache.read_text, sha)
+        if text is not None:
+            return text
+        try:
+            # The worker reads the PDF itself, so its bytes never pass through the loop
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(self.parse_pool, self.parse_fn, self.cache.pdf_path(sha))
+        except Exception as e:
+            print(f"  Error extracting PDF text from {url}: {e}")
+            return None
+        if self.record_parse:
+            text, pages, seconds = text
+            self.record_parse(pages, seconds)
+            metrics.inc('stage_busy_seconds', seconds, stage='parse')
+            metrics.inc('stage_items_total', stage='parse')
+        await asyncio.to_thread(self.cache.write_text, sha, text)
+        return text
+
+    async def analyze_resume(self, session, text, app):
+        if self.batcher is not None:
+            # The batcher sends requests from its own threads
+            return await asyncio.wrap_future(self.batcher.submit(str(app['id']), (text, app), len(text)))
+
+        full_input = self.build_input(text, app)
+        timeout = aiohttp.ClientTimeout(total=120)
+        loop = asyncio.get_running_loop()
+        max_retries = self.retry_policy.max_attempts
+        attempt = 0
+        overload_attempt = 0
+        give_up_at = loop.time() + self.max_overload_wait
+        while attempt < max_retries:
+            overloaded = False
+            retry_after = None
+            outcome = 'error'
+            await self.webhook_limiter.acquire_async()
+            start = loop.time()
+            try:
+                async with session.post(self.api_url, data={'input': full_input}, timeout=timeout) as response:
+                    overloaded = is_overload_status(response.status)
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    response.raise_for_status()
+                    # The webhook does not always label its JSON correctly
+                    result = await response.json(content_type=None)
+                analysis = self.parse_output(result)
+                outcome = 'ok'
+                return analysis
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                overloaded = True
+                error = e
+            except Exception as e:
+                error = e
+            finally:
+                latency = loop.time() - start
+                self.webhook_limiter.release(overloaded, latency, retry_after)
+                metrics.observe('webhook_seconds', latency, outcome='overloaded' if overloaded else outcome)
+
+            # Overload does not use up attempts; the limiter pauses callers instead
+            if overloaded and loop.time() < give_up_at:
+                metrics.inc('webhook_retries_total', reason='overload')
+                print(f"  Analysis API overloaded, backing off: {error}")
+                await asyncio.sleep(self.retry_policy.backoff(overload_attempt, retry_after))
+                overload_attempt += 1
+                continue
+
+            attempt += 1
+            print(f"  Error calling analysis API (Attempt {attempt}/{max_retries}): {error}")
+            if attempt < max_retries:
+                metrics.inc('webhook_retries_total', reason='error')
+                await asyncio.sleep(self.retry_policy.backoff(attempt - 1))
+        return None
+
+    async def process(self, session, app):
+        resume_url = app.get('resume_id')
+        if not resume_url:
+            print(f"  No resume URL found for ID {app['id']}. Skipping analysis.")
+            app['analysis'] = None
+            return app
+
+        if self.dedupe and self.dedupe.match_contact(app):
+            print(f"  Reusing analysis of ID {app['duplicate_of']} (same candidate).")
+            return app
+
+        sha = await self.download_resume(session, resume_url)
+        if not sha:
+            print(f"  Failed to download resume for ID {app['id']}.")
+            app['analysis_error'] = "Failed to extract PDF text"
+            return app
+
+        if self.dedupe and await self.dedupe.match_resume_async(app, sha):
+            print(f"  Reusing analysis of ID {app['duplicate_of']} (same resume).")
+            self.cache.unpin(sha)
+            return app
+
+        try:
+            return await self.analyze_download(session, app, sha, resume_url)
+        finally:
+            # Lets waiting applications with the same resume move on
+            if self.dedupe:
+                self.dedupe.finish(app, sha)
+
+    async def analyze_download(self, session, app, sha, resume_url):
+        pdf_text = await self.extract_text(session, sha, resume_url)
+        if pdf_text and self.prepare_text:
+            pdf_text = self.prepare_text(pdf_text, app)
+        if not pdf_text:
+            print(f"  Failed to extract text for ID {app['id']}.")
+            app['analysis_error'] = "Failed to extract PDF text"
+            return app
+
+        extraction = self.local_extractor.extract(pdf_text) if self.local_extractor else None
+        if extraction and self.local_extractor.skip_webhook(extraction):
+            print(f"  Extracted ID {app['id']} locally, skipping the API.")
+            app['ai_data'] = self.local_extractor.local_analysis(app, extraction)
+            return app
+
+        start = time.monotonic()
+        analysis_result = await self.analyze_resume(session, pdf_text, app)
+        metrics.inc('stage_busy_seconds', time.monotonic() - start, stage='analysis')
+        metrics.inc('stage_items_total', stage='analysis')
+        if analysis_result:
+            print(f"  Analysis successful for ID {app['id']}.")
+            if extraction:
+                self.local_extractor.complete(app, extraction, analysis_result)
+            app['ai_data'] = analysis_result
+        else:
+            print(f"  Analysis failed for ID {app['id']}.")
+            app['analysis_error'] = "API analysis failed"
+        return app
+
+    async def run(self, apps, on_result, total=None):
+        self._host_limits = defaultdict(lambda: asyncio.Semaphore(self.resume_limit))
+        queue = asyncio.Queue(maxsize=self.max_in_flight)
+        metrics.register_stage('download', self.resume_limit)
+        metrics.register_stage('parse', self.parse_workers)
+        metrics.register_stage('analysis', self.webhook_limit)
+        metrics.start_sampler('queue_depth', lambda: {'pending': queue.qsize()})
+        metrics.start_sampler('webhook_concurrency', lambda: {
+            'limit': self.webhook_limiter.limit, 'in_flight': self.webhook_limiter.in_flight})
+
+        connector = aiohttp.TCPConnector(
+            limit=self.resume_limit + self.webhook_limit,
+            keepalive_timeout=60,
+        )
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    index, app = item
+                    print(f"Processing {index+1}{f'/{total}' if total else ''}: ID {app['id']} - {app['name']}")
+                    try:
+                        on_result(await self.process(session, app))
+                    except Exception as e:
+                        print(f"Error processing application {app['id']}: {e}")
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.max_in_flight)]
+            # `apps` may block while it waits for records (e.g. a fetch queue), so read it off the loop
+            apps = iter(apps)
+            index = 0
+            while (app := await asyncio.to_thread(next, apps, None)) is not None:
+                await queue.put((index, app))
+                index += 1
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+
+def run_async(apps, on_result, total=None, **kwargs):
+    """Process `apps` (any iterable) with the asyncio engine, calling `on_result` for each one."""
+    engine = AsyncEngine(**kwargs)
+    asyncio.run(engine.run(apps, on_result, total))
+    return engine
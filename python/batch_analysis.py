@@ -0,0 +1,124 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Condition, Thread
+
+# Defaults for packing resumes into one webhook request
+MAX_BATCH_ITEMS = 8
+# Roughly 15k tokens of resume text per request
+MAX_BATCH_CHARS = 60000
+# Seconds the first item in a batch may wait for company
+MAX_BATCH_WAIT = 2.0
+
+
+class MicroBatcher:
+    """
+    Packs individual requests into small batches.
+
+    `submit()` returns a Future right away. A batch is sent as soon as it
+    holds `max_items` items or `max_chars` characters, or when its oldest
+    item has waited `max_wait` seconds. `send_batch(items)` receives a list
+    of `(key, payload)` pairs and returns a dict of key -> result; any item
+    it leaves out (or sets to None), or a whole batch that fails, is retried
+    on its own with `fallback(key, payload)`.
+    """
+
+    def __init__(self, send_batch, fallback, max_items=MAX_BATCH_ITEMS, max_chars=MAX_BATCH_CHARS,
+                 max_wait=MAX_BATCH_WAIT, workers=4):
+        self.send_batch = send_batch
+        self.fallback = fallback
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.max_wait = max_wait
+        self._pending = []
+        self._pending_chars = 0
+        self._oldest = None
+        self._closed = False
+        self._cond = Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._collector = Thread(target=self._collect, name="micro-batcher", daemon=True)
+        self._collector.start()
+        self.stats = {'batches': 0, 'batched_items': 0, 'fallbacks': 0}
+
+    def submit(self, key, payload, size):
+        """Queue one item of `size` characters and return a Future for its result."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((key, payload, size, future))
+            self._pending_chars += size
+            self._cond.notify_all()
+        return future
+
+    def _is_full(self):
+        return len(self._pending) >= self.max_items or self._pending_chars >= self.max_chars
+
+    def _take_batch(self):
+        batch = []
+        chars = 0
+        while self._pending:
+            size = self._pending[0][2]
+            # Always take at least one item, even if it is over the budget alone
+            if batch and (len(batch) >= self.max_items or chars + size > self.max_chars):
+                break
+            batch.append(self._pending.pop(0))
+            chars += size
+        self._pending_chars -= chars
+        self._oldest = time.monotonic() if self._pending else None
+        return batch
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                while not self._is_full() and not self._closed:
+                    remaining = self._oldest + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        results = None
+        if len(batch) > 1:
+            try:
+                results = self.send_batch([(key, payload) for key, payload, _, _ in batch])
+            except Exception as e:
+                print(f"  Batch of {len(batch)} failed, retrying items one by one: {e}")
+        results = results or {}
+
+        with self._cond:
+            if results:
+                self.stats['batches'] += 1
+            self.stats['batched_items'] += sum(1 for key, _, _, _ in batch if results.get(key) is not None)
+            if len(batch) > 1:
+                self.stats['fallbacks'] += sum(1 for key, _, _, _ in batch if results.get(key) is None)
+
+        # A lone item goes straight to `fallback`, which is the single request
+        for key, payload, _, future in batch:
+            try:
+                result = results.get(key)
+                if result is None:
+                    result = self.fallback(key, payload)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self):
+        """Send whatever is still queued and wait for all batches to finish."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+
+    def report(self):
+        s = self.stats
+        print(f"Micro-batching: {s['batches']} batch requests covering {s['batched_items']} applications, "
+              f"{s['fallbacks']} fell back to single requests")
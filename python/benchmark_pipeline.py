@@ -0,0 +1,365 @@
+import argparse
+import contextlib
+import functools
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import product
+from multiprocessing import get_context
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlsplit
+
+SKILLS = ['Python', 'SQL', 'React', 'Excel', 'Figma', 'Recruitment', 'Communication', 'AWS', 'Docker', 'Java']
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries']
+DEGREES = ['B.Tech', 'B.Com', 'MBA', 'MSW', 'M.Sc']
+# Extra latency per additional resume in a batched webhook request, as a share of one call
+BATCH_ITEM_COST = 0.3
+
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(pages):
+    """A minimal text PDF with one Helvetica page per list of lines."""
+    objects = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for lines in pages:
+        ops = 'BT /F1 10 Tf 40 800 Td 12 TL ' + ' '.join(f'({_pdf_escape(line)}) Tj T*' for line in lines) + ' ET'
+        stream = ops.encode('latin-1', 'replace')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        page_ids.append(len(objects))
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    kids = ' '.join(f'{n} 0 R' for n in page_ids).encode()
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(page_ids))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def synthetic_resume(applicant_id, pages=2):
+    """Resume pages with the sections, dates and repeated header/footer real ones have."""
+    rng = random.Random(applicant_id)
+    start = rng.randint(2010, 2020)
+    body = ['Work Experience']
+    for company in rng.sample(COMPANIES, 3):
+        end = min(start + rng.randint(1, 4), 2025)
+        body += [f'{rng.choice(["Engineer", "Analyst", "HR Executive"])} at {company}', f'{start} - {end}']
+        body += [f'Worked on project {rng.randint(1, 999)} with a team of {rng.randint(2, 12)}.' for _ in range(6)]
+        start = end
+    body += ['Skills', ', '.join(rng.sample(SKILLS, 5)), 'Education', f'{rng.choice(DEGREES)}, 20{rng.randint(5, 15):02d}']
+    per_page = math.ceil(len(body) / pages)
+    return [
+        [f'Applicant {applicant_id} - Resume'] + body[i * per_page:(i + 1) * per_page] + [f'Page {i + 1} of {pages}']
+        for i in range(pages)
+    ]
+
+
+class StandInConfig:
+    """Latency (median seconds, lognormal spread) and failure rates of the local stand-ins."""
+
+    def __init__(self, applications=500, wp_latency=0.05, pdf_latency=0.05, webhook_latency=0.5,
+                 latency_spread=0.5, error_rate=0.0, overload_rate=0.0, pdf_pages=2, seed=0):
+        self.applications = applications
+        self.wp_latency = wp_latency
+        self.pdf_latency = pdf_latency
+        self.webhook_latency = webhook_latency
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.overload_rate = overload_rate
+        self.pdf_pages = pdf_pages
+        self.seed = seed
+
+
+class StandInServer:
+    """
+    One local HTTP server standing in for the WP applications API
+    (/wp-json/wp/v2/application/), the resume host (/resumes/<id>.pdf) and
+    the n8n analysis webhook (/webhook).
+
+    Responses follow the real formats: X-WP-TotalPages and 400 past the last
+    page, PDFs with an ETag, and the webhook's fenced JSON output (or a list
+    of {id, output} items for a batch). Webhook calls fail with 500 at
+    `error_rate` and with 429 + Retry-After at `overload_rate`.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._lock = Lock()
+        self.webhook_requests = 0
+        self.webhook_items = 0
+        self.applications = self._applications()
+        self._pdfs = {}
+        self._server = None
+
+    def _applications(self):
+        rng = random.Random(self.config.seed)
+        oldest = 1735689600  # 2025-01-01
+        apps = []
+        for i in range(self.config.applications, 0, -1):
+            apps.append({
+                'id': i,
+                'name': f'Applicant {i}',
+                'email': f'applicant{i}@example.com',
+                'mobile_number': f'98{i:08d}',
+                'linkedin': None,
+                'portfolio_link': None,
+                'current_ctc': str(rng.randint(3, 30)),
+                'expected_ctc': str(rng.randint(3, 40)),
+                'notice_period': rng.choice(['Immediate', '30 days', '60 days']),
+                # Filled in once the server knows its port
+                'resume_id': i if rng.random() > 0.05 else None,
+                'job_id': str(rng.randint(1, 20)),
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(oldest + i * 600)),
+            })
+        return apps
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def _latency(self, median):
+        if median <= 0:
+            return 0
+        with self._lock:
+            return median * math.exp(self._random.gauss(0, self.config.latency_spread))
+
+    def _roll(self):
+        with self._lock:
+            return self._random.random()
+
+    def pdf(self, applicant_id):
+        with self._lock:
+            content = self._pdfs.get(applicant_id)
+        if content is None:
+            content = build_pdf(synthetic_resume(applicant_id, self.config.pdf_pages))
+            with self._lock:
+                self._pdfs[applicant_id] = content
+        return content
+
+    def analysis_output(self, text):
+        rng = random.Random(len(text))
+        analysis = {
+            'ats_score': rng.randint(20, 95),
+            'current_job_title': 'Engineer',
+            'total_experience_years': rng.randint(1, 15),
+            'skills': rng.sample(SKILLS, 4),
+            'prevous_companies_names': rng.sample(COMPANIES, 2),
+            'projects': [],
+        }
+        return '```json\n' + json.dumps(analysis) + '\n```'
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path.startswith('/resumes/'):
+                    time.sleep(stand_in._latency(stand_in.config.pdf_latency))
+                    applicant_id = int(parts.path.rsplit('/', 1)[1].split('.')[0])
+                    self._send(200, stand_in.pdf(applicant_id), [('Content-Type', 'application/pdf'),
+                                                                  ('ETag', f'"{applicant_id}"')])
+                elif parts.path.startswith('/wp-json/wp/v2/application'):
+                    time.sleep(stand_in._latency(stand_in.config.wp_latency))
+                    self._send(*stand_in.wp_page(parse_qs(parts.query)))
+                else:
+                    self._send(404)
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode())
+                self._send(*stand_in.webhook(form))
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            # Hundreds of clients connect at once at high concurrency settings
+            request_queue_size = 1024
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        for app in self.applications:
+            if isinstance(app['resume_id'], int):
+                app['resume_id'] = f"{self.url}/resumes/{app['resume_id']}.pdf"
+        Thread(target=self._server.serve_forever, name='stand-in', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wp_page(self, query):
+        per_page = int(query.get('per_page', ['10'])[0])
+        page = int(query.get('page', ['1'])[0])
+        apps = self.applications
+        if 'after' in query:
+            apps = [app for app in apps if app['date'] > query['after'][0]]
+        total_pages = max(1, math.ceil(len(apps) / per_page))
+        if page > total_pages:
+            return 400, b'{"code":"rest_post_invalid_page_number"}', []
+        body = json.dumps(apps[(page - 1) * per_page:page * per_page]).encode()
+        return 200, body, [('Content-Type', 'application/json'), ('X-WP-TotalPages', str(total_pages))]
+
+    def webhook(self, form):
+        batch = json.loads(form['batch'][0]) if 'batch' in form else None
+        items = len(batch) if batch else 1
+        with self._lock:
+            self.webhook_requests += 1
+            self.webhook_items += items
+        time.sleep(self._latency(self.config.webhook_latency) * (1 + BATCH_ITEM_COST * (items - 1)))
+
+        roll = self._roll()
+        if roll < self.config.overload_rate:
+            return 429, b'', [('Retry-After', '1')]
+        if roll < self.config.overload_rate + self.config.error_rate:
+            return 500, b'Internal Server Error', []
+        if batch:
+            result = [{'id': item['id'], 'output': self.analysis_output(item['input'])} for item in batch]
+        else:
+            result = [{'output': self.analysis_output(form.get('input', [''])[0])}]
+        return 200, json.dumps(result).encode(), [('Content-Type', 'application/json')]
+
+
+def run_setting(base_url, workdir, engine, workers, batch_size):
+    """
+    Run fetch -> process -> Excel export once, in a fresh process and directory.
+
+    Returns the timings of each step plus the processing run report.
+    """
+    os.chdir(workdir)
+    import async_engine
+    import convert_to_excel
+    import get_data
+    import process_applications as p
+    from rate_limit import AdaptiveController
+
+    get_data.API_URL = base_url + '/wp-json/wp/v2/application/'
+    p.API_URL = base_url + '/webhook'
+    p.DOWNLOAD_WORKERS = p.ANALYSIS_WORKERS = workers
+    p.webhook_limiter = AdaptiveController('Analysis API', initial_limit=workers, max_limit=workers,
+                                           latency_target=p.WEBHOOK_LATENCY_TARGET)
+    # The engine's limits are keyword defaults, so bind them for main()'s late import
+    async_engine.run_async = functools.partial(async_engine.run_async, resume_limit=workers, webhook_limit=workers)
+
+    timings = {}
+    with open('run.log', 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        start = time.perf_counter()
+        get_data.full_sync(p.INPUT_FILE)
+        timings['fetch'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        p.main(engine=engine, batch_size=batch_size)
+        timings['process'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        convert_to_excel.convert_json_to_excel(p.OUTPUT_FILE, 'processed_applications.xlsx')
+        timings['export'] = time.perf_counter() - start
+
+    with open(p.RUN_REPORT_FILE, encoding='utf-8') as f:
+        report = json.load(f)
+    return timings, report
+
+
+def _ms(summary, key):
+    value = (summary or {}).get(key)
+    return f'{value * 1000:.0f}' if value is not None else '-'
+
+
+def main(config, engines, worker_counts, batch_sizes, keep=False):
+    server = StandInServer(config).start()
+    print(f"Stand-ins on {server.url}: {config.applications} applications, webhook median "
+          f"{config.webhook_latency}s, {config.error_rate:.0%} errors, {config.overload_rate:.0%} overloads")
+    print(f"{'engine':>8} {'workers':>7} {'batch':>5}  {'fetch':>6} {'process':>8} {'export':>6}  "
+          f"{'apps/s':>7}  {'hook p50':>8} {'hook p99':>8} {'dl p99':>6}  {'calls':>5}  {'errors':>6}  bottleneck")
+    root = tempfile.mkdtemp(prefix='ark-hr-bench-')
+    try:
+        for engine, workers, batch_size in product(engines, worker_counts, batch_sizes):
+            workdir = os.path.join(root, f'{engine}-{workers}-{batch_size}')
+            os.makedirs(workdir)
+            calls_before = server.webhook_requests
+            # Module-level caches, limiters and metrics start clean in a new process
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                timings, report = executor.submit(run_setting, server.url, workdir, engine, workers, batch_size).result()
+
+            outcomes = report['counters'].get('applications_total', {})
+            processed = sum(outcomes.values())
+            webhook = report['histograms'].get('webhook_seconds', {}).get('outcome=ok')
+            download = report['histograms'].get('download_seconds', {}).get('')
+            print(f"{engine:>8} {workers:>7} {batch_size or '-':>5}  {timings['fetch']:>5.1f}s {timings['process']:>7.1f}s "
+                  f"{timings['export']:>5.1f}s  {processed / timings['process']:>7.1f}  "
+                  f"{_ms(webhook, 'p50'):>6}ms {_ms(webhook, 'p99'):>6}ms {_ms(download, 'p99'):>4}ms  "
+                  f"{server.webhook_requests - calls_before:>5}  {outcomes.get('outcome=error', 0):>6}  "
+                  f"{report.get('bottleneck') or '-'}")
+    finally:
+        server.stop()
+        if keep:
+            print(f"Run directories kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark fetch -> process -> Excel export against local stand-ins for WordPress, "
+                    "the resume host and the analysis webhook.")
+    parser.add_argument('--applications', type=int, default=500)
+    parser.add_argument('--engines', nargs='+', choices=['threads', 'asyncio'], default=['threads', 'asyncio'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[5, 20, 50],
+                        help="Download and webhook concurrency settings to compare")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[0], help="0 = one resume per webhook call")
+    parser.add_argument('--wp-latency', type=float, default=0.05, help="Median seconds per WP page")
+    parser.add_argument('--pdf-latency', type=float, default=0.05, help="Median seconds per resume download")
+    parser.add_argument('--webhook-latency', type=float, default=0.5, help="Median seconds per webhook call")
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help="Sigma of the lognormal latencies; larger means longer tails")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of webhook calls answered with 500")
+    parser.add_argument('--overload-rate', type=float, default=0.0,
+                        help="Share of webhook calls answered with 429 and Retry-After")
+    parser.add_argument('--pdf-pages', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true', help="Keep each run's output files and log")
+    args = parser.parse_args()
+    main(
+        StandInConfig(
+            applications=args.applications,
+            wp_latency=args.wp_latency,
+            pdf_latency=args.pdf_latency,
+            webhook_latency=args.webhook_latency,
+            latency_spread=args.latency_spread,
+            error_rate=args.error_rate,
+            overload_rate=args.overload_rate,
+            pdf_pages=args.pdf_pages,
+            seed=args.seed,
+        ),
+        args.engines,
+        args.workers,
+        args.batch_sizes,
+        keep=args.keep,
+    )
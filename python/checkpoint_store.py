@@ -0,0 +1,134 @@
+import json
+import os
+from threading import Lock
+
+from records import JsonArrayWriter, iter_records
+
+
+def default_log_path(output_file):
+    """Return the checkpoint log path that sits next to an output file."""
+    base, _ = os.path.splitext(output_file)
+    return base + '.checkpoint.jsonl'
+
+
+class CheckpointStore:
+    """
+    Append-only result store for processed applications.
+
+    Every finished record is written as a single JSON line to a log file, so
+    saving a result costs the same no matter how many results came before it.
+    The log is compacted into the regular JSON array file (the format the
+    other scripts read) every `compact_every` records and when the store is
+    closed.
+    """
+
+    def __init__(self, output_file, log_file=None, compact_every=500, fsync=True):
+        self.output_file = output_file
+        self.log_file = log_file or default_log_path(output_file)
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = Lock()
+        self._fh = None
+        self._since_compact = 0
+
+    def _open(self):
+        if self._fh is None:
+            self._fh = open(self.log_file, 'a', encoding='utf-8')
+        return self._fh
+
+    def iter_log(self):
+        """Stream records from the checkpoint log, one line at a time."""
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a truncated last line
+                    print(f"  Skipping unreadable checkpoint line in {self.log_file}")
+
+    def load_processed_ids(self):
+        """Rebuild the set of processed IDs by streaming the output file and the log."""
+        processed_ids = set()
+        try:
+            for item in iter_records(self.output_file):
+                processed_ids.add(item['id'])
+        except ValueError as e:
+            print(f"  Could not fully read {self.output_file}: {e}")
+        for record in self.iter_log():
+            processed_ids.add(record['id'])
+        return processed_ids
+
+    def load_failed_ids(self):
+        """IDs whose latest stored record has an analysis error."""
+        failed_ids = set()
+        for record in self.iter_processed():
+            if 'analysis_error' in record:
+                failed_ids.add(record['id'])
+            else:
+                failed_ids.discard(record['id'])
+        return failed_ids
+
+    def iter_processed(self):
+        """Stream every processed record: the output file, then the log."""
+        yield from iter_records(self.output_file)
+        yield from self.iter_log()
+
+    def append(self, record):
+        """Durably append one processed record to the log."""
+        with self._lock:
+            fh = self._open()
+            fh.write(json.dumps(record) + '\n')
+            fh.flush()
+            if self.fsync:
+                os.fsync(fh.fileno())
+            self._since_compact += 1
+            should_compact = self.compact_every and self._since_compact >= self.compact_every
+
+        if should_compact:
+            self.compact()
+
+    def compact(self):
+        """
+        Merge the log into the JSON array output file and truncate the log.
+
+        Records in the log replace output records with the same ID. Both files
+        are streamed, and the result is written to a temporary file and swapped
+        in atomically, so a crash at any point leaves either the old or the new
+        file plus a log that can be merged again safely.
+        """
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            self._since_compact = 0
+
+            # Only the last log entry for an ID is kept
+            last_seen = {}
+            for position, record in enumerate(self.iter_log()):
+                last_seen[record['id']] = position
+            if not last_seen:
+                return 0
+
+            # Stream output + log into a temporary file that is swapped in
+            with JsonArrayWriter(self.output_file) as writer:
+                for item in iter_records(self.output_file):
+                    if item['id'] not in last_seen:
+                        writer.write(item)
+                for position, record in enumerate(self.iter_log()):
+                    if last_seen[record['id']] == position:
+                        writer.write(record)
+
+            # The output now holds everything in the log
+            open(self.log_file, 'w', encoding='utf-8').close()
+            return len(last_seen)
+
+    def close(self):
+        """Compact any pending records and release the log file."""
+        count = self.compact()
+        if count:
+            print(f"Compacted {count} checkpointed records into {self.output_file}")
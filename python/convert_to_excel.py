@@ -1,9 +1,11 @@
 
 import json
-import pandas as pd
+import tempfile
 from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from records import iter_records
 
 def flatten_json(y):
     """
@@ -30,21 +32,24 @@ def process_application_data(data):
     """
     Processes the application data to be suitable for Excel.
     This involves flattening the nested 'ai_data' and formatting lists.
+    Accepts any iterable of records and yields flattened rows one at a time.
+    The records themselves are left unchanged.
     """
-    processed_data = []
     for item in data:
+        # Everything but ai_data, which is flattened below or dropped. Other
+        # nested values (e.g. local_fields confidences) become JSON text,
+        # since Excel cells only take scalars.
+        flat_item = {
+            key: json.dumps(value) if isinstance(value, (dict, list)) else value
+            for key, value in item.items() if key != 'ai_data'
+        }
+
         # Handle cases where ai_data might be missing or there's an error
         if 'ai_data' not in item or 'analysis_error' in item:
-            flat_item = item.copy()
-            if 'ai_data' in flat_item:
-                del flat_item['ai_data'] # remove to avoid partial processing
-            processed_data.append(flat_item)
+            yield flat_item
             continue
 
-        ai_data = item.pop('ai_data')
-
-        # Flatten the main application details
-        flat_item = item.copy()
+        ai_data = item['ai_data']
 
         # Process and flatten ai_data separately
         if ai_data:
@@ -83,75 +88,82 @@ def process_application_data(data):
             else:
                 flat_item['ai_projects'] = ""
 
-        processed_data.append(flat_item)
-
-    return processed_data
+        yield flat_item
 
 
 def convert_json_to_excel(json_file_path, excel_file_path):
     """
     Reads a JSON file, processes it, and saves it as a formatted Excel file.
+
+    Records are streamed through openpyxl's write-only mode, so memory stays
+    flat however many applications there are. Write-only sheets need column
+    widths before the first row, so flattened rows are spooled to a temporary
+    file while the widths are measured, then written out in a second pass.
     """
-    # Step 1: Install pandas if you don't have it
-    # pip install pandas openpyxl
-
-    # Step 2: Read the JSON file
-    with open(json_file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # Step 3: Process the data
-    processed_data = process_application_data(data)
-
-    # Step 4: Create a pandas DataFrame
-    df = pd.DataFrame(processed_data)
-
-    # Step 5: Save to Excel with formatting using openpyxl
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Applications"
-
-    for r in dataframe_to_rows(df, index=False, header=True):
-        ws.append(r)
-
-    # Formatting
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    thin_border = Border(left=Side(style='thin'),
-                         right=Side(style='thin'),
-                         top=Side(style='thin'),
-                         bottom=Side(style='thin'))
-
-    # Apply formatting to header
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = thin_border
-
-    # Adjust column widths and apply text wrapping and borders
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter  # Get the column name
-        for cell in col:
-            cell.border = thin_border
-            # Apply text wrapping for multi-line content
-            if "\n" in str(cell.value):
-                cell.alignment = Alignment(wrap_text=True, vertical='top')
-
-            try:  # Necessary to avoid error on empty cells
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        
-        # Adjust width, with a cap for very long text
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = min(adjusted_width, 60)
+    # Step 1: Install openpyxl if you don't have it
+    # pip install openpyxl
+
+    # Step 2: Flatten each record once, measuring columns as rows are produced
+    widths = {}  # column name -> longest value, in first-seen order
+    row_count = 0
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+        for row in process_application_data(iter_records(json_file_path)):
+            for key, value in row.items():
+                length = len(str(value)) if value is not None else 0
+                if key not in widths:
+                    widths[key] = len(str(key))
+                if length > widths[key]:
+                    widths[key] = length
+            spool.write(json.dumps(row) + "\n")
+            row_count += 1
+
+        # Step 3: Stream the rows into a write-only workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Applications")
+        columns = list(widths)
 
-    # Freeze the top row
-    ws.freeze_panes = 'A2'
+        # Adjust width, with a cap for very long text
+        for index, column in enumerate(columns, start=1):
+            ws.column_dimensions[get_column_letter(index)].width = min(widths[column] + 2, 60)
+
+        # Freeze the top row
+        ws.freeze_panes = 'A2'
+
+        # Formatting
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+        thin_border = Border(left=Side(style='thin'),
+                             right=Side(style='thin'),
+                             top=Side(style='thin'),
+                             bottom=Side(style='thin'))
+        wrap_alignment = Alignment(wrap_text=True, vertical='top')
+
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(ws, value=column)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.border = thin_border
+            header.append(cell)
+        ws.append(header)
+
+        spool.seek(0)
+        for line in spool:
+            row = json.loads(line)
+            cells = []
+            for column in columns:
+                value = row.get(column)
+                cell = WriteOnlyCell(ws, value=value)
+                cell.border = thin_border
+                # Apply text wrapping for multi-line content
+                if isinstance(value, str) and "\n" in value:
+                    cell.alignment = wrap_alignment
+                cells.append(cell)
+            ws.append(cells)
 
     # Add auto-filter
-    ws.auto_filter.ref = ws.dimensions
+    if columns:
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{row_count + 1}"
 
     # Save the workbook
     wb.save(excel_file_path)
@@ -159,8 +171,8 @@ def convert_json_to_excel(json_file_path, excel_file_path):
 
 
 if __name__ == "__main__":
-    # Before running, make sure you have pandas and openpyxl installed:
-    # pip install pandas openpyxl
+    # Before running, make sure you have openpyxl installed:
+    # pip install openpyxl
     
     JSON_FILE = 'processed_applications.json'
     EXCEL_FILE = 'processed_applications.xlsx'
@@ -0,0 +1,169 @@
+import argparse
+import os
+import shutil
+from datetime import datetime
+from itertools import islice
+
+from records import iter_records
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # checked in convert_json_to_dataset
+    pa = None
+
+# Rows per Arrow record batch; bounds memory however large the input is
+BATCH_ROWS = 10000
+FORMATS = {'parquet': 'parquet', 'feather': 'ipc'}
+
+# Application form fields; WordPress sends them all as text
+TEXT_FIELDS = [
+    'name', 'email', 'mobile_number', 'linkedin', 'portfolio_link',
+    'current_ctc', 'expected_ctc', 'notice_period', 'resume_id', 'job_id',
+]
+# ai_data fields, named like the columns of the applicants table
+AI_TEXT_FIELDS = ['current_job_title', 'gender', 'highest_qualification', 'notable_achievement']
+AI_LIST_FIELDS = ['social_links', 'skills', 'domains_worked', 'previous_companies_names']
+
+
+def build_schema():
+    project = pa.struct([('name', pa.string()), ('description', pa.string()), ('url', pa.string())])
+    return pa.schema(
+        [('id', pa.int64()), ('date', pa.timestamp('s'))]
+        + [(field, pa.string()) for field in TEXT_FIELDS]
+        + [('ats_score', pa.float64()), ('total_experience_years', pa.float64())]
+        + [(field, pa.string()) for field in AI_TEXT_FIELDS]
+        + [(field, pa.list_(pa.string())) for field in AI_LIST_FIELDS]
+        + [('projects', pa.list_(project)),
+           ('analysis_error', pa.string()),
+           ('duplicate_of', pa.int64())]
+    )
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None and value != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _integer(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _timestamp(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _text_list(value):
+    # The model sometimes answers a list field with a single string
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [str(item) for item in value if item]
+
+
+def _projects(value):
+    if not isinstance(value, list):
+        return []
+    return [
+        {'name': _text(p.get('name')), 'description': _text(p.get('description')), 'url': _text(p.get('url'))}
+        for p in value if isinstance(p, dict)
+    ]
+
+
+def to_row(app):
+    """Map a processed application onto the export schema, coercing stray types."""
+    ai_data = app.get('ai_data') or {}
+    if 'analysis_error' in app or not isinstance(ai_data, dict):
+        ai_data = {}
+
+    row = {'id': _integer(app.get('id')), 'date': _timestamp(app.get('date'))}
+    for field in TEXT_FIELDS:
+        row[field] = _text(app.get(field))
+    row['ats_score'] = _number(ai_data.get('ats_score'))
+    row['total_experience_years'] = _number(ai_data.get('total_experience_years'))
+    for field in AI_TEXT_FIELDS:
+        row[field] = _text(ai_data.get(field))
+    for field in AI_LIST_FIELDS:
+        row[field] = _text_list(ai_data.get(field))
+    # Note the typo the analysis output uses
+    if 'prevous_companies_names' in ai_data:
+        row['previous_companies_names'] = _text_list(ai_data['prevous_companies_names'])
+    row['projects'] = _projects(ai_data.get('projects'))
+    row['analysis_error'] = _text(app.get('analysis_error'))
+    row['duplicate_of'] = _integer(app.get('duplicate_of'))
+    return row
+
+
+def iter_batches(records, schema, batch_rows=BATCH_ROWS):
+    """Stream records as Arrow record batches of at most `batch_rows` rows."""
+    records = iter(records)
+    while True:
+        rows = [to_row(app) for app in islice(records, batch_rows)]
+        if not rows:
+            return
+        yield pa.RecordBatch.from_pylist(rows, schema=schema)
+
+
+def convert_json_to_dataset(json_file_path, output_dir, file_format='parquet', partition_by_job=True):
+    """
+    Export processed applications as a columnar dataset.
+
+    List fields stay native list<string> and list<struct> columns instead of
+    joined strings. Records are streamed in batches, and with
+    `partition_by_job` the files are laid out Hive-style (job_id=16941/...),
+    so readers like pandas, DuckDB or Polars can skip whole jobs. Feather is
+    the Arrow IPC file format and can be memory-mapped.
+    """
+    if pa is None:
+        raise RuntimeError("The columnar export needs pyarrow: pip install pyarrow")
+
+    schema = build_schema()
+    options = {}
+    if file_format == 'parquet':
+        options['file_options'] = ds.ParquetFileFormat().make_write_options(compression='zstd')
+
+    # Replace the previous export as a whole so no stale partition survives
+    tmp_dir = output_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    ds.write_dataset(
+        iter_batches(iter_records(json_file_path), schema),
+        tmp_dir,
+        schema=schema,
+        format=FORMATS[file_format],
+        partitioning=['job_id'] if partition_by_job else None,
+        partitioning_flavor='hive' if partition_by_job else None,
+        basename_template='part-{i}.' + ('parquet' if file_format == 'parquet' else 'feather'),
+        **options,
+    )
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    print(f"Successfully exported {json_file_path} to {output_dir} ({file_format})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export processed applications as Parquet or Feather.")
+    parser.add_argument('--input', default='processed_applications.json')
+    parser.add_argument('--output', default=None,
+                        help="Output directory (default: processed_applications_<format>)")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet')
+    parser.add_argument('--no-partition', action='store_true', help="Write unpartitioned files instead of job_id=... directories")
+    args = parser.parse_args()
+    convert_json_to_dataset(
+        args.input,
+        args.output or f"processed_applications_{args.format}",
+        file_format=args.format,
+        partition_by_job=not args.no_partition,
+    )
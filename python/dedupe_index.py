@@ -0,0 +1,154 @@
+import asyncio
+import json
+import re
+from concurrent.futures import Future
+from threading import Lock
+
+# Which keys count as "the same candidate"
+MATCH_MODES = {
+    'off': (),
+    # Byte-identical resume only; always safe to reuse the analysis
+    'resume': ('resume',),
+    # Also email or phone, which skips the download but reuses the analysis
+    # of whichever resume that candidate sent first
+    'contact': ('resume', 'email', 'phone'),
+}
+
+_GMAIL_DOMAINS = {'gmail.com', 'googlemail.com'}
+
+
+def normalize_email(email):
+    if not email or '@' not in email:
+        return None
+    local, _, domain = email.strip().lower().rpartition('@')
+    if domain in _GMAIL_DOMAINS:
+        # Gmail ignores dots and +tags in the local part
+        local = local.split('+', 1)[0].replace('.', '')
+        domain = 'gmail.com'
+    return f"{local}@{domain}" if local else None
+
+
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', str(phone or ''))
+    # Drop country code / trunk prefix; Indian mobile numbers are 10 digits
+    if len(digits) < 10:
+        return None
+    return digits[-10:]
+
+
+class DedupeIndex:
+    """
+    Finds applications whose resume was already analyzed.
+
+    The same person often applies to several jobs with the same resume.
+    Analyzed applications are indexed by resume content hash and, in
+    'contact' mode, by normalized email and phone. A later application that
+    matches reuses the stored `ai_data` and is linked to the first one via
+    `duplicate_of`, instead of paying for another analysis.
+    """
+
+    def __init__(self, mode='resume'):
+        self.keys = MATCH_MODES[mode]
+        self._lock = Lock()
+        self._canonical = {}  # match key -> canonical application id
+        # canonical application id -> ai_data as compact JSON, a fraction of the dict's size
+        self._analyses = {}
+        self._in_flight = {}  # resume hash -> Future set when its analysis ends
+        self.stats = {'resume': 0, 'email': 0, 'phone': 0}
+
+    def _contact_keys(self, app):
+        keys = []
+        if 'email' in self.keys:
+            email = normalize_email(app.get('email'))
+            if email:
+                keys.append(('email', email))
+        if 'phone' in self.keys:
+            phone = normalize_phone(app.get('mobile_number'))
+            if phone:
+                keys.append(('phone', phone))
+        return keys
+
+    def add(self, app, resume_hash=None):
+        """Index an application that has a successful analysis."""
+        ai_data = app.get('ai_data')
+        if not ai_data or not self.keys:
+            return
+        keys = self._contact_keys(app)
+        if resume_hash and 'resume' in self.keys:
+            keys.append(('resume', resume_hash))
+        with self._lock:
+            canonical_id = app.get('duplicate_of', app['id'])
+            if canonical_id not in self._analyses:
+                self._analyses[canonical_id] = json.dumps(ai_data, separators=(',', ':'))
+            for key in keys:
+                self._canonical.setdefault(key, canonical_id)
+
+    def _reuse_locked(self, app, keys):
+        for kind, value in keys:
+            canonical_id = self._canonical.get((kind, value))
+            if canonical_id is not None and canonical_id != app['id']:
+                self.stats[kind] += 1
+                app['ai_data'] = json.loads(self._analyses[canonical_id])
+                app['duplicate_of'] = canonical_id
+                return True
+        return False
+
+    def _reuse(self, app, keys):
+        with self._lock:
+            return self._reuse_locked(app, keys)
+
+    def _claim(self, app, resume_hash):
+        """Reuse, claim the analysis (None), or return the Future to wait on."""
+        with self._lock:
+            if self._reuse_locked(app, [('resume', resume_hash)]):
+                return True
+            pending = self._in_flight.get(resume_hash)
+            if pending is None:
+                self._in_flight[resume_hash] = Future()
+                return None
+            return pending
+
+    def match_contact(self, app):
+        """Before download: reuse an analysis for a known email or phone."""
+        return self._reuse(app, self._contact_keys(app))
+
+    def match_resume(self, app, resume_hash):
+        """After download: reuse an analysis for a byte-identical resume."""
+        if 'resume' not in self.keys or not resume_hash:
+            return False
+        while True:
+            claim = self._claim(app, resume_hash)
+            if claim is True:
+                return True
+            if claim is None:
+                return False
+            claim.result()
+
+    async def match_resume_async(self, app, resume_hash):
+        """asyncio version of `match_resume`."""
+        if 'resume' not in self.keys or not resume_hash:
+            return False
+        while True:
+            claim = self._claim(app, resume_hash)
+            if claim is True:
+                return True
+            if claim is None:
+                return False
+            await asyncio.wrap_future(claim)
+
+    def finish(self, app, resume_hash):
+        """Record the outcome of an analysis claimed through `match_resume`."""
+        self.add(app, resume_hash)
+        with self._lock:
+            pending = self._in_flight.pop(resume_hash, None)
+        if pending is not None:
+            pending.set_result(None)
+
+    def report(self):
+        if not self.keys:
+            return
+        s = self.stats
+        saved = sum(s.values())
+        print(f"Duplicate detection: {saved} analyses reused "
+              f"({s['resume']} same resume, {s['email']} same email, {s['phone']} same phone), "
+              f"{len(self._analyses)} candidates indexed")
@@ -1,72 +1,164 @@
 import urllib.request
+import urllib.parse
 import json
-import time
 import os
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from records import JsonArrayWriter, iter_records
 
-base_url = "https://manager.pocketful.in/wp-json/wp/v2/application/?_fields=id,name,email,mobile_number,linkedin,portfolio_link,current_ctc,expected_ctc,notice_period,resume_id,job_id,date&per_page=100&page={}"
-all_data = []
-page = 1
-output_file = 'fetched_applications.json'
+API_URL = "https://manager.pocketful.in/wp-json/wp/v2/application/"
+FIELDS = "id,name,email,mobile_number,linkedin,portfolio_link,current_ctc,expected_ctc,notice_period,resume_id,job_id,date"
+PER_PAGE = 100
+OUTPUT_FILE = 'fetched_applications.json'
+# Pages fetched at once during a full resync; kept small to be nice to the server
+FETCH_WORKERS = 4
+# WP's `after` is exclusive, so incremental fetches start this far before the
+# last date seen and drop the applications they already have
+FETCH_OVERLAP_SECONDS = 10 * 60
+# User-Agent is often required by WP security plugins
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
 
-print("Starting data fetch...")
 
-while True:
-    url = base_url.format(page)
+def build_url(page, after=None):
+    params = {'_fields': FIELDS, 'per_page': PER_PAGE, 'page': page}
+    if after:
+        # Newest first, so the file keeps the same order as a full fetch
+        params.update({'after': after, 'orderby': 'date', 'order': 'desc'})
+    return API_URL + '?' + urllib.parse.urlencode(params)
+
+
+def overlap_start(date, overlap=FETCH_OVERLAP_SECONDS):
+    """The `after` to ask for so applications at (or just before) `date` are read again."""
+    if not date:
+        return None
+    return (datetime.fromisoformat(date) - timedelta(seconds=overlap)).isoformat(timespec='seconds')
+
+
+def fetch_page(page, after=None):
+    """
+    Fetch one page of applications.
+
+    Returns (records, total_pages), with total_pages None if the server did
+    not send a usable X-WP-TotalPages. Asking for a page past the end returns
+    an empty list rather than raising, since WP answers those with a 400.
+    """
+    url = build_url(page, after)
     print(f"Fetching page {page}...")
+    req = urllib.request.Request(url, headers=HEADERS)
     try:
-        # User-Agent is often required by WP security plugins
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'})
-        with urllib.request.urlopen(req) as response:
-            if response.status != 200:
-                print(f"Failed with status {response.status}")
-                break
-            
-            response_body = response.read().decode('utf-8')
+        with urllib.request.urlopen(req, timeout=60) as response:
             try:
-                data = json.loads(response_body)
-            except json.JSONDecodeError:
-                print("Failed to decode JSON response")
-                break
-            
-            if not data:
-                print("No more data found (empty list).")
-                break
-            
-            if isinstance(data, list):
-                all_data.extend(data)
-                print(f"Retrieved {len(data)} records. Total so far: {len(all_data)}")
-                
-                # If we got less than 100 records, this is likely the last page
-                if len(data) < 100:
-                    print("Received less than 100 records, assuming end of data.")
-                    break
-            elif isinstance(data, dict) and 'code' in data:
-                 # Handle WP API error responses like {'code': 'rest_post_invalid_page_number', ...}
-                 print(f"API Error: {data.get('message', 'Unknown error')}")
-                 break
-            else:
-                print("Unexpected data format.")
-                break
-            
-            page += 1
-            # Be nice to the server
-            time.sleep(0.5)
-            
+                total_pages = int(response.headers['X-WP-TotalPages'])
+            except (KeyError, TypeError, ValueError):
+                total_pages = None
+            data = json.loads(response.read().decode('utf-8'))
     except urllib.error.HTTPError as e:
-        print(f"HTTP Error: {e.code} - {e.reason}")
         # 400 Bad Request is often returned when page number is out of range
         if e.code == 400:
-            print("Reached end of pages (400 Bad Request).")
-        break
+            print(f"Reached end of pages at page {page} (400 Bad Request).")
+            return [], 0
+        raise
+
+    if isinstance(data, dict) and 'code' in data:
+        # Handle WP API error responses like {'code': 'rest_post_invalid_page_number', ...}
+        raise RuntimeError(f"API Error: {data.get('message', 'Unknown error')}")
+    if not isinstance(data, list):
+        raise RuntimeError("Unexpected data format.")
+    return data, total_pages
+
+
+def fetch_all(after=None, workers=FETCH_WORKERS):
+    """
+    Yield every application (newer than `after`, if given) in page order.
+
+    The first page tells us X-WP-TotalPages; the remaining pages are fetched
+    concurrently by a bounded pool and yielded in order as they complete.
+    Without that header, pages are read one by one until a short page.
+    """
+    first, total_pages = fetch_page(1, after)
+    if total_pages is None:
+        print(f"Retrieved {len(first)} records from page 1 (no X-WP-TotalPages, paging until a short page).")
+        yield from first
+        page, data = 1, first
+        while len(data) >= PER_PAGE:
+            page += 1
+            data, _ = fetch_page(page, after)
+            print(f"Retrieved {len(data)} records from page {page}.")
+            yield from data
+        return
+
+    print(f"Retrieved {len(first)} records from page 1 of {total_pages or 1}.")
+    yield from first
+    if total_pages <= 1:
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pages = executor.map(lambda page: fetch_page(page, after)[0], range(2, total_pages + 1))
+        for page, data in enumerate(pages, start=2):
+            print(f"Retrieved {len(data)} records from page {page} of {total_pages}.")
+            yield from data
+
+
+def full_sync(output_file=OUTPUT_FILE, workers=FETCH_WORKERS):
+    """Refetch every application and rewrite the output file."""
+    print("Starting full data fetch...")
+    seen_ids = set()
+    with JsonArrayWriter(output_file) as writer:
+        for record in fetch_all(workers=workers):
+            # Pages can shift while we read them; skip anything seen twice
+            if record['id'] in seen_ids:
+                continue
+            seen_ids.add(record['id'])
+            writer.write(record)
+    print(f"Finished fetching. Saved {writer.count} records to {os.path.abspath(output_file)}")
+
+
+def incremental_sync(output_file=OUTPUT_FILE, workers=FETCH_WORKERS):
+    """Fetch only applications newer than the latest one already on disk."""
+    last_date = None
+    known_ids = set()
+    for item in iter_records(output_file):
+        known_ids.add(item['id'])
+        if last_date is None or item['date'] > last_date:
+            last_date = item['date']
+    if not known_ids:
+        print("No existing data found, falling back to a full fetch.")
+        return full_sync(output_file, workers)
+
+    print(f"Starting incremental fetch of applications after {last_date}...")
+
+    new_count = 0
+    with JsonArrayWriter(output_file) as writer:
+        for record in fetch_all(after=overlap_start(last_date), workers=workers):
+            if record['id'] in known_ids:
+                continue
+            known_ids.add(record['id'])
+            writer.write(record)
+            new_count += 1
+        # Existing records are streamed back from the file being replaced
+        for item in iter_records(output_file):
+            writer.write(item)
+    print(f"Finished fetching. Added {new_count} new records ({writer.count} total) to {os.path.abspath(output_file)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch job applications from the WordPress API.")
+    parser.add_argument('--mode', choices=['incremental', 'full'], default='incremental',
+                        help="incremental: only applications newer than the saved ones; full: refetch everything")
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--workers', type=int, default=FETCH_WORKERS, help="Pages fetched concurrently")
+    args = parser.parse_args()
+
+    try:
+        if args.mode == 'full':
+            full_sync(args.output, args.workers)
+        else:
+            incremental_sync(args.output, args.workers)
     except Exception as e:
         print(f"Error: {e}")
-        break
+        print("Existing data was left unchanged.")
 
-print(f"Finished fetching. Saving {len(all_data)} records to {output_file}...")
 
-try:
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(all_data, f, indent=4)
-    print(f"Successfully saved data to {os.path.abspath(output_file)}")
-except Exception as e:
-    print(f"Error saving file: {e}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import re
+from datetime import date
+from threading import Lock
+
+from resume_text import split_sections
+
+# Fields the webhook would otherwise have to fill; everything else in
+# ai_data (ats_score, projects, ...) needs the model
+LOCAL_FIELDS = ('social_links', 'skills', 'total_experience_years', 'highest_qualification')
+EXTRACT_MODES = {
+    'off': "always use the webhook",
+    'fill': "use the webhook, then fill fields it left empty from local extraction",
+    'fallback': "only call the webhook when local extraction is not confident",
+}
+# Local values at or above this confidence are trusted
+MIN_CONFIDENCE = 0.8
+
+# Canonical skill name -> extra spellings. Matching is case-insensitive on
+# whole words; short or everyday words (C, R, Go, Express, ...) are left
+# to the model
+SKILL_VOCABULARY = {
+    'Python': [], 'Java': [], 'JavaScript': ['js', 'java script'], 'TypeScript': [],
+    'C++': ['cpp'], 'C#': ['c sharp'], 'Golang': [], 'Rust': [], 'Kotlin': [], 'Swift': [],
+    'PHP': [], 'Ruby': [], 'Dart': [], 'Scala': [], 'SQL': [], 'MySQL': [], 'PostgreSQL': ['postgres'],
+    'MongoDB': [], 'Redis': [], 'SQLite': [], 'Oracle': [], 'Firebase': [], 'Supabase': [],
+    'HTML': ['html5'], 'CSS': ['css3'], 'Sass': ['scss'], 'Tailwind CSS': ['tailwind', 'tailwindcss'],
+    'Bootstrap': [], 'React': ['reactjs', 'react.js'], 'React Native': [], 'Next.js': ['nextjs'],
+    'Angular': ['angularjs'], 'Vue.js': ['vuejs'], 'Redux': [], 'Node.js': ['nodejs'],
+    'Express.js': ['expressjs'], 'Django': [], 'Flask': [], 'FastAPI': [], 'Spring Boot': [],
+    '.NET': ['dotnet', 'asp.net'], 'Laravel': [], 'WordPress': [], 'Shopify': [], 'Flutter': [],
+    'Android': [], 'iOS': [], 'REST API': ['rest apis', 'restful', 'restful apis'], 'GraphQL': [],
+    'Git': [], 'GitHub': [], 'Docker': [], 'Kubernetes': ['k8s'], 'AWS': ['amazon web services'],
+    'Azure': [], 'GCP': ['google cloud'], 'Linux': [], 'CI/CD': [], 'Jenkins': [],
+    'Machine Learning': ['ml'], 'Deep Learning': [], 'Data Analysis': ['data analytics'], 'Pandas': [],
+    'NumPy': [], 'TensorFlow': [], 'PyTorch': [], 'Power BI': ['powerbi'], 'Tableau': [],
+    'Excel': ['ms excel', 'microsoft excel', 'advanced excel'], 'MS Office': ['microsoft office', 'ms-office'],
+    'PowerPoint': ['ms powerpoint'], 'Google Sheets': [], 'Figma': [], 'Adobe XD': [], 'Canva': [],
+    'Photoshop': ['adobe photoshop'], 'Illustrator': ['adobe illustrator'], 'Premiere Pro': ['adobe premiere pro'],
+    'After Effects': [], 'UI/UX': ['ui/ux design', 'ux design', 'ui design'], 'Wireframing': [],
+    'Prototyping': [], 'Graphic Design': [], 'Typography': [], 'SEO': ['search engine optimization'],
+    'Digital Marketing': [], 'Social Media Marketing': [], 'Content Writing': [], 'Copywriting': [],
+    'Google Analytics': [], 'Google Ads': [], 'Email Marketing': [], 'Tally': ['tally erp'], 'SAP': [],
+    'Salesforce': [], 'HubSpot': [], 'Zoho': [], 'Jira': [], 'Agile': [], 'Scrum': [],
+    'Recruitment': ['recruiting', 'talent acquisition'], 'Onboarding': [], 'Payroll': [],
+    'Employee Relations': ['employee relation'], 'HR Operations': [], 'Performance Management': [],
+    'Communication': ['communication skills'], 'Leadership': [], 'Team Management': [],
+    'Project Management': [], 'Public Speaking': [], 'Negotiation': [], 'Problem Solving': [],
+    'Time Management': [], 'Customer Service': [], 'Sales': [], 'Business Development': [],
+    'Lead Generation': [], 'Cold Calling': [], 'Accounting': [], 'Financial Analysis': [],
+}
+
+# Highest level first
+QUALIFICATION_LEVELS = [
+    ('Doctorate', r'ph\.?\s?d|doctorate'),
+    ('Masters', r'm\.?\s?tech|m\.\s?e\.|m\.?\s?sc|m\.?\s?c\.?\s?a|mba|pgdm|pgdbm|m\.?\s?com|m\.\s?a\.|msw|'
+                r'post[- ]?graduat\w*|master(?:\'?s)?(?: of| in| degree)?'),
+    ('Bachelors', r'b\.?\s?tech|b\.\s?e\.|b\.?\s?sc|b\.?\s?c\.?\s?a|b\.?\s?b\.?\s?a|b\.?\s?com|b\.\s?a\.|'
+                  r'graduat(?:e|ion)|bachelor(?:\'?s)?(?: of| in| degree)?'),
+    ('Diploma', r'diploma|polytechnic'),
+    ('Higher Secondary', r'12th|xii|hsc|higher secondary|senior secondary|intermediate'),
+]
+# One pass finds every level; the group name says which level matched
+_QUALIFICATION = re.compile(
+    r'(?<![a-z])(?:' + '|'.join(f'(?P<level{rank}>{pattern})' for rank, (_, pattern) in enumerate(QUALIFICATION_LEVELS))
+    + r')(?![a-z])',
+    re.IGNORECASE,
+)
+
+# The lookaheads let the regex engine skip positions that cannot start a match
+_URL = re.compile(
+    r'(?=[hwlgbd])(?<![@\w])(?:https?://|www\.|(?:linkedin\.com|github\.com|behance\.net|dribbble\.com)/)'
+    r'[^\s,;()<>"\']+',
+    re.IGNORECASE,
+)
+
+_MONTHS = {m: i for i, m in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+_DATE = r"(?:(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s*'?\d{2,4}|\d{1,2}\s*[/.-]\s*\d{4}|\d{4})"
+_DATE_RANGE = re.compile(
+    rf'(?=[0-9adfjmnos])(?P<start>{_DATE})\s*(?:-|–|—|to|till|until)\s*(?P<end>{_DATE}|present|current|now|till date|date|ongoing)',
+    re.IGNORECASE,
+)
+_YEARS_STATED = re.compile(r'(\d{1,2}(?:\.\d)?)\s*\+?\s*years?\s+(?:of\s+)?(?:total\s+|work\s+|professional\s+|industry\s+)?experience',
+                           re.IGNORECASE)
+
+
+def _trie_pattern(words):
+    """
+    Compile words into one regex shaped like a trie.
+
+    Alternatives share their prefixes, so the regex engine walks the text
+    once per position like a keyword automaton, in C rather than Python.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if end else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Finds whole-word keywords in text and maps each spelling to its canonical name."""
+
+    def __init__(self, vocabulary):
+        self._canonical = {}
+        for name, aliases in vocabulary.items():
+            for spelling in [name, *aliases]:
+                self._canonical[' '.join(spelling.lower().split())] = name
+        self._pattern = re.compile(r'(?<![\w.+#])' + _trie_pattern(self._canonical) + r'(?![\w+#]|\.\w)')
+
+    def find(self, text):
+        """Canonical names found in text, in order of first appearance."""
+        found = {}
+        # Lowercasing once is much cheaper than a case-insensitive pattern
+        for match in self._pattern.finditer(' '.join(text.lower().split())):
+            name = self._canonical.get(match.group())
+            if name:
+                found.setdefault(name, None)
+        return list(found)
+
+
+def _parse_date(text, today):
+    text = text.strip().lower()
+    if text in ('present', 'current', 'now', 'till date', 'date', 'ongoing'):
+        return today.year, today.month
+    numbers = re.findall(r'\d+', text)
+    year = int(numbers[-1])
+    if year < 100:
+        year += 2000 if year <= today.year % 100 else 1900
+    month = _MONTHS.get(text[:3])
+    if month is None:
+        month = int(numbers[0]) if len(numbers) == 2 else None
+    if not 1950 <= year <= today.year or (month is not None and not 1 <= month <= 12):
+        return None
+    return year, month
+
+
+def experience_years(sections, today=None):
+    """Total years across date ranges in experience sections, and a confidence."""
+    today = today or date.today()
+    intervals = []
+    approximate = False
+    for kind, text in sections:
+        if kind != 'experience':
+            continue
+        for match in _DATE_RANGE.finditer(text):
+            start = _parse_date(match.group('start'), today)
+            end = _parse_date(match.group('end'), today)
+            if not start or not end:
+                continue
+            # Year-only ranges count from January to January
+            approximate |= start[1] is None or end[1] is None
+            first = start[0] * 12 + (start[1] or 1) - 1
+            last = end[0] * 12 + (end[1] or 1) - 1
+            if first <= last:
+                intervals.append((first, last))
+
+    if intervals:
+        # Overlapping jobs are only counted once
+        months = 0
+        current_start, current_end = None, None
+        for first, last in sorted(intervals):
+            if current_end is None or first > current_end:
+                if current_end is not None:
+                    months += current_end - current_start
+                current_start, current_end = first, last
+            else:
+                current_end = max(current_end, last)
+        months += current_end - current_start
+        return months // 12, 0.7 if approximate else 0.85
+
+    stated = _YEARS_STATED.search('\n'.join(text for _, text in sections))
+    if stated:
+        return int(float(stated.group(1))), 0.8
+    return None, 0.0
+
+
+def _highest(text):
+    best = None
+    for match in _QUALIFICATION.finditer(text):
+        rank = int(match.lastgroup[len('level'):])
+        if best is None or rank < best[0]:
+            best = (rank, match.group())
+    if best is None:
+        return None
+    rank, found = best
+    return f"{QUALIFICATION_LEVELS[rank][0]}, {' '.join(found.split())}"
+
+
+def highest_qualification(sections):
+    """Highest degree mentioned, preferring the education section, and a confidence."""
+    found = _highest('\n'.join(text for kind, text in sections if kind == 'education'))
+    if found:
+        return found, 0.85
+    found = _highest('\n'.join(text for _, text in sections))
+    if found:
+        return found, 0.7
+    return None, 0.0
+
+
+def social_links(text):
+    """Profile and portfolio URLs written out in the text, and a confidence."""
+    links = {}
+    for match in _URL.finditer(text):
+        link = match.group().rstrip('.,:;!?)]}')
+        if '@' not in link:
+            links.setdefault(link, None)
+    # Links are often only clickable text in the PDF, so finding none is weak evidence
+    return list(links), 0.95 if links else 0.5
+
+
+class Extraction:
+    """Locally extracted ai_data fields, each with a confidence from 0 to 1."""
+
+    __slots__ = ('values', 'confidence')
+
+    def __init__(self, values, confidence):
+        self.values = values
+        self.confidence = confidence
+
+    def confident_fields(self, min_confidence=MIN_CONFIDENCE):
+        return [field for field in LOCAL_FIELDS if self.confidence[field] >= min_confidence]
+
+    def fill(self, ai_data, min_confidence=MIN_CONFIDENCE):
+        """Fill fields the model left empty with confident local values; returns the fields filled."""
+        filled = []
+        for field in self.confident_fields(min_confidence):
+            if ai_data.get(field) in (None, '', [], 0) and self.values[field] not in (None, []):
+                ai_data[field] = self.values[field]
+                filled.append(field)
+        return filled
+
+
+class LocalExtractor:
+    """
+    Pulls the mechanical ai_data fields out of resume text without the webhook.
+
+    Links, skills from SKILL_VOCABULARY, years of experience from date ranges
+    and the highest qualification are found with compiled regexes. In
+    'fallback' mode an application whose fields are all confident is not sent
+    to the webhook at all, so its model-only fields (ats_score, projects, ...)
+    stay empty; in 'fill' mode the webhook is always called and local values
+    only fill what it left empty.
+    """
+
+    def __init__(self, mode='off', min_confidence=MIN_CONFIDENCE):
+        if mode not in EXTRACT_MODES:
+            raise ValueError(f"Unknown local extraction mode: {mode}")
+        self.mode = mode
+        self.min_confidence = min_confidence
+        self._skills = KeywordMatcher(SKILL_VOCABULARY)
+        self._lock = Lock()
+        self.stats = {'extracted': 0, 'skipped_webhook': 0, 'filled_fields': 0}
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def extract(self, text):
+        sections = split_sections(text)
+        skills = self._skills.find(text)
+        values, confidence = {}, {}
+        values['social_links'], confidence['social_links'] = social_links(text)
+        values['skills'] = skills
+        # More known skills found means fewer the model would add
+        confidence['skills'] = min(0.9, 0.5 + 0.05 * len(skills)) if skills else 0.0
+        values['total_experience_years'], confidence['total_experience_years'] = experience_years(sections)
+        values['highest_qualification'], confidence['highest_qualification'] = highest_qualification(sections)
+        with self._lock:
+            self.stats['extracted'] += 1
+        return Extraction(values, confidence)
+
+    def skip_webhook(self, extraction):
+        """True when 'fallback' mode can use the local fields alone."""
+        skip = (self.mode == 'fallback'
+                and len(extraction.confident_fields(self.min_confidence)) == len(LOCAL_FIELDS))
+        if skip:
+            with self._lock:
+                self.stats['skipped_webhook'] += 1
+        return skip
+
+    def complete(self, app, extraction, ai_data):
+        """Fill a webhook result from the extraction and record which fields came from it."""
+        if not isinstance(ai_data, dict):
+            return ai_data
+        filled = extraction.fill(ai_data, self.min_confidence)
+        if filled:
+            app['local_fields'] = {field: extraction.confidence[field] for field in filled}
+            with self._lock:
+                self.stats['filled_fields'] += len(filled)
+        return ai_data
+
+    def local_analysis(self, app, extraction):
+        """ai_data made of local fields only, for applications that skip the webhook."""
+        app['local_fields'] = dict(extraction.confidence)
+        return dict(extraction.values)
+
+    def report(self):
+        if not self.enabled:
+            return
+        s = self.stats
+        print(f"Local extraction ({self.mode}): {s['extracted']} resumes, "
+              f"{s['skipped_webhook']} webhook calls skipped, {s['filled_fields']} empty fields filled")
@@ -1,126 +1,370 @@
 import json
 import os
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from threading import Lock
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import pathlib
+from records import iter_records
 
-# Load environment variables from the root .env file
+# Environment variables come from the root .env file
 env_path = pathlib.Path(__file__).parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
-
 url: str = "https://ponbdoassgzccditvnzm.supabase.co"
-key: str = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-service_key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+_client = None
 
-if not url or not key:
-    print("Error: Supabase URL or Key not found in .env")
-    exit(1)
+BATCH_SIZE = 50
+UPLOAD_WORKERS = 4
+JSON_FILE = pathlib.Path(__file__).parent / 'processed_applications.json'
+DEAD_LETTER_FILE = pathlib.Path(__file__).parent / 'migration_dead_letter.jsonl'
+# Content hash of every applicant row last stored, so unchanged rows are skipped
+MANIFEST_FILE = pathlib.Path(__file__).parent / 'migration_manifest.json'
+# Stored-row hashes are written to the manifest this often during a long run
+MANIFEST_SAVE_EVERY = 500
+# Put in a row stream to upload partially filled batches right away
+FLUSH = object()
+# Columns the dashboard edits. They are only sent when a row is first
+# inserted, so re-syncs never move a candidate back to "new".
+UI_OWNED_FIELDS = {"status"}
 
-# Use service key if available for bypassing RLS, otherwise use anon key
-supabase: Client = create_client(url, service_key if service_key else key)
+def get_client() -> Client:
+    """Create the Supabase client on first use, so importing this module has no side effects."""
+    global _client
+    if _client is None:
+        load_dotenv(dotenv_path=env_path)
+        key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            raise RuntimeError("Supabase URL or Key not found in .env")
+        # Use service key if available for bypassing RLS, otherwise use anon key
+        _client = create_client(url, service_key if service_key else key)
+    return _client
 
-def migrate_data():
-    print("Starting migration...")
-    
-    # 1. Fetch a workspace ID
-    print("Fetching default workspace...")
-    workspace_response = supabase.table("workspaces").select("id").limit(1).execute()
+
+def transform_applicant(app, workspace_id, valid_job_ids):
+    """Map a processed application onto a row of the applicants table."""
+    ai_data = app.get('ai_data', {})
     
-    if not workspace_response.data:
-        print("Error: No workspace found. Please create a workspace first.")
-        return
+    job_id = str(app.get("job_id"))
+    if job_id:
+        job_id = job_id.strip()
+        
+    if job_id == "None" or job_id == "" or job_id == "null":
+        job_id = None
+        
+    if job_id and job_id not in valid_job_ids:
+        # print(f"Warning: Job ID '{job_id}' not found in DB. Setting to NULL.")
+        job_id = None
 
-    workspace_id = workspace_response.data[0]['id']
-    print(f"Using Workspace ID: {workspace_id}")
+    # Map fields
+    return {
+        "id": app.get("id"),
+        "applied_at": app.get("date"),
+        "name": app.get("name"),
+        "email": app.get("email"),
+        "mobile_number": app.get("mobile_number"),
+        "linkedin": app.get("linkedin"),
+        "portfolio_link": app.get("portfolio_link"),
+        "current_ctc": app.get("current_ctc"),
+        "expected_ctc": app.get("expected_ctc"),
+        "notice_period": app.get("notice_period"),
+        "resume_link": app.get("resume_id"), # Mapping resume_id to resume_link
+        "job_id": job_id, 
+        "workspace_id": workspace_id,
+        "status": "new",
+        
+        # Flattened AI Data
+        "ats_score": ai_data.get("ats_score"),
+        "social_links": ai_data.get("social_links", []),
+        "current_job_title": ai_data.get("current_job_title"),
+        "gender": ai_data.get("gender"),
+        "total_experience_years": ai_data.get("total_experience_years"),
+        "highest_qualification": ai_data.get("highest_qualification"),
+        "skills": ai_data.get("skills", []),
+        "domains_worked": ai_data.get("domains_worked", []),
+        "notable_achievement": ai_data.get("notable_achievement"),
+        "previous_companies_names": ai_data.get("prevous_companies_names", []), # Note typo in JSON: prevous -> previous
+        "projects": ai_data.get("projects", [])
+    }
 
-    # 1.1 Fetch valid Job IDs
-    print("Fetching valid job IDs...")
-    jobs_response = supabase.table("jobs").select("job_id").execute()
-    valid_job_ids = {str(j['job_id']).strip() for j in jobs_response.data}
-    print(f"Found {len(valid_job_ids)} valid jobs. Sample: {list(valid_job_ids)[:5]}")
 
-    # 2. Read JSON data
-    json_path = pathlib.Path(__file__).parent / 'processed_applications.json'
-    if not json_path.exists():
-        print(f"Error: JSON file not found at {json_path}")
-        return
+def content_hash(row):
+    """Hash of the pipeline-owned columns of an applicant row."""
+    owned = {k: v for k, v in row.items() if k not in UI_OWNED_FIELDS}
+    return hashlib.sha256(json.dumps(owned, sort_keys=True, default=str).encode('utf-8')).hexdigest()
 
-    print(f"Reading data from {json_path}...")
-    with open(json_path, 'r', encoding='utf-8') as f:
-        applicants_data = json.load(f)
 
-    print(f"Found {len(applicants_data)} applicants to migrate.")
+def load_manifest(path=MANIFEST_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Warning: could not read manifest {path}, treating every row as changed.")
+        return {}
 
-    # 3. Transform and Insert Data
-    batch_size = 50
-    batch = []
-    
-    for i, app in enumerate(applicants_data):
-        ai_data = app.get('ai_data', {})
-        
-        job_id = str(app.get("job_id"))
-        if job_id:
-            job_id = job_id.strip()
-            
-        if job_id == "None" or job_id == "" or job_id == "null":
-            job_id = None
-            
-        if job_id and job_id not in valid_job_ids:
-            # print(f"Warning: Job ID '{job_id}' not found in DB. Setting to NULL.")
-            job_id = None
-
-        # Map fields
-        new_applicant = {
-            "id": app.get("id"),
-            "applied_at": app.get("date"),
-            "name": app.get("name"),
-            "email": app.get("email"),
-            "mobile_number": app.get("mobile_number"),
-            "linkedin": app.get("linkedin"),
-            "portfolio_link": app.get("portfolio_link"),
-            "current_ctc": app.get("current_ctc"),
-            "expected_ctc": app.get("expected_ctc"),
-            "notice_period": app.get("notice_period"),
-            "resume_link": app.get("resume_id"), # Mapping resume_id to resume_link
-            "job_id": job_id, 
-            "workspace_id": workspace_id,
-            "status": "new",
-            
-            # Flattened AI Data
-            "ats_score": ai_data.get("ats_score"),
-            "social_links": ai_data.get("social_links", []),
-            "current_job_title": ai_data.get("current_job_title"),
-            "gender": ai_data.get("gender"),
-            "total_experience_years": ai_data.get("total_experience_years"),
-            "highest_qualification": ai_data.get("highest_qualification"),
-            "skills": ai_data.get("skills", []),
-            "domains_worked": ai_data.get("domains_worked", []),
-            "notable_achievement": ai_data.get("notable_achievement"),
-            "previous_companies_names": ai_data.get("prevous_companies_names", []), # Note typo in JSON: prevous -> previous
-            "projects": ai_data.get("projects", [])
-        }
-        
-        batch.append(new_applicant)
-        
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_existing_ids(page_size=1000):
+    """IDs already in the applicants table, so existing candidates are never sent as new."""
+    ids = set()
+    start = 0
+    while True:
+        response = get_client().table("applicants").select("id").range(start, start + page_size - 1).execute()
+        ids.update(str(row['id']) for row in response.data)
+        if len(response.data) < page_size:
+            return ids
+        start += page_size
+
+
+class BatchUploader:
+    """
+    Upserts batches of applicants concurrently without losing rows.
+
+    A failed batch is split in half and each half retried, down to single
+    rows, so one bad record only costs its own row. Rows that still fail are
+    appended to a dead-letter JSONL file together with the error message.
+    """
+
+    def __init__(self, workers=UPLOAD_WORKERS, dead_letter_file=DEAD_LETTER_FILE, on_stored=None, on_failed=None):
+        self.workers = workers
+        self.dead_letter_file = dead_letter_file
+        self.on_stored = on_stored
+        self.on_failed = on_failed
+        self.upserted = 0
+        self.dead_lettered = 0
+        self._lock = Lock()
+        self._started = time.monotonic()
+
+    def _dead_letter(self, row, error):
+        with self._lock:
+            with open(self.dead_letter_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"row": row, "error": str(error)}) + "\n")
+            self.dead_lettered += 1
+            if self.on_failed:
+                self.on_failed(row)
+
+    def upload(self, batch):
+        """Upsert `batch`, bisecting on failure. Returns the number of rows stored."""
+        try:
+            # upsert to handle potential duplicates if running multiple times
+            get_client().table("applicants").upsert(batch).execute()
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"  Row {batch[0].get('id')} failed: {e}")
+                self._dead_letter(batch[0], e)
+                return 0
+            middle = len(batch) // 2
+            return self.upload(batch[:middle]) + self.upload(batch[middle:])
+
+        with self._lock:
+            self.upserted += len(batch)
+            if self.on_stored:
+                self.on_stored(batch)
+        return len(batch)
+
+    def throughput(self):
+        elapsed = time.monotonic() - self._started
+        return (self.upserted + self.dead_lettered) / elapsed if elapsed > 0 else 0.0
+
+    def run(self, batches):
+        """Upload batches with a bounded number in flight, so memory stays flat."""
+        max_pending = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for batch in batches:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                    print(f"Progress: {self.upserted} upserted, {self.dead_lettered} failed ({self.throughput():.1f} rows/s)")
+                pending.add(executor.submit(self.upload, batch))
+            for future in wait(pending).done:
+                future.result()
+
+
+def iter_batches(rows, batch_size):
+    """
+    Group rows into batches of rows with the same columns.
+
+    PostgREST takes the column list of a bulk upsert from its rows, so inserts
+    (which carry UI-owned columns) and updates (which do not) are kept apart.
+    A FLUSH marker in `rows` yields the partly filled batches at once.
+    """
+    batches = {}
+    for row in rows:
+        if row is FLUSH:
+            for columns, batch in batches.items():
+                if batch:
+                    yield batch
+                    batches[columns] = []
+            continue
+        columns = frozenset(row)
+        batch = batches.setdefault(columns, [])
+        batch.append(row)
         if len(batch) >= batch_size:
-            print(f"Inserting batch of {len(batch)} records (Progress: {i+1}/{len(applicants_data)})...")
-            try:
-                # upsert=True to handle potential duplicates if running multiple times
-                supabase.table("applicants").upsert(batch).execute()
-            except Exception as e:
-                print(f"Error inserting batch: {e}")
-            finally:
-                batch = []
-                
-    # Insert remaining
-    if batch:
-        print(f"Inserting final batch of {len(batch)} records...")
+            yield batch
+            batches[columns] = []
+    for batch in batches.values():
+        if batch:
+            yield batch
+
+
+class ApplicantSync:
+    """
+    Upserts processed applications into the applicants table.
+
+    `prepare()` looks up the workspace, the valid job IDs and which rows are
+    already stored; `run(apps)` then transforms and uploads the new or changed
+    rows from any iterable of applications, including one that is still being
+    produced. The manifest is saved every MANIFEST_SAVE_EVERY stored rows and
+    when the run ends, so an interrupted run resumes where it stopped.
+    `on_stored(rows)` hears about every row that is in the table as read,
+    including unchanged rows that are skipped.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, workers=UPLOAD_WORKERS, dead_letter_file=DEAD_LETTER_FILE,
+                 manifest_file=MANIFEST_FILE, full=False, on_stored=None, on_failed=None):
+        self.batch_size = batch_size
+        self.manifest_file = manifest_file
+        self.full = full
+        self.on_stored = on_stored
+        self.uploader = BatchUploader(workers=workers, dead_letter_file=dead_letter_file,
+                                      on_stored=self._record_stored, on_failed=on_failed)
+        self.workspace_id = None
+        self.valid_job_ids = set()
+        self.manifest = {}
+        self.known_ids = set()
+        self.read_count = 0
+        self.unchanged_count = 0
+        self.inserted_count = 0
+        self._unsaved = 0
+
+    def prepare(self):
+        """Load what the upload needs from the database. Returns False if there is no workspace."""
+        # 1. Fetch a workspace ID
+        print("Fetching default workspace...")
+        workspace_response = get_client().table("workspaces").select("id").limit(1).execute()
+
+        if not workspace_response.data:
+            print("Error: No workspace found. Please create a workspace first.")
+            return False
+
+        self.workspace_id = workspace_response.data[0]['id']
+        print(f"Using Workspace ID: {self.workspace_id}")
+
+        # 1.1 Fetch valid Job IDs
+        print("Fetching valid job IDs...")
+        jobs_response = get_client().table("jobs").select("job_id").execute()
+        self.valid_job_ids = {str(j['job_id']).strip() for j in jobs_response.data}
+        print(f"Found {len(self.valid_job_ids)} valid jobs. Sample: {list(self.valid_job_ids)[:5]}")
+
+        # 2. Work out which rows are new or changed since the last migration.
+        # An interrupted run or a dead-lettered row leaves gaps in the manifest,
+        # so only the table says which applicants exist already.
+        self.manifest = {} if self.full else load_manifest(self.manifest_file)
+        print("Fetching existing applicant IDs...")
+        self.known_ids = fetch_existing_ids() | set(self.manifest)
+        print(f"Found {len(self.known_ids)} applicants already in the database.")
+        return True
+
+    def rows(self, apps):
+        """Yield the applicant rows of `apps` that need uploading; FLUSH markers pass through."""
+        for app in apps:
+            if app is FLUSH:
+                yield app
+                continue
+            self.read_count += 1
+            row = transform_applicant(app, self.workspace_id, self.valid_job_ids)
+            row_id = str(row["id"])
+            if self.manifest.get(row_id) == content_hash(row):
+                self.unchanged_count += 1
+                # Already stored as-is, which is what on_stored listeners wait for
+                if self.on_stored:
+                    self.on_stored([row])
+                continue
+            if row_id in self.known_ids:
+                # Existing candidate: leave dashboard-owned columns alone
+                row = {k: v for k, v in row.items() if k not in UI_OWNED_FIELDS}
+            else:
+                self.known_ids.add(row_id)
+                self.inserted_count += 1
+            yield row
+
+    def _record_stored(self, batch):
+        # Called under the uploader's lock
+        for row in batch:
+            self.manifest[str(row["id"])] = content_hash(row)
+        self._unsaved += len(batch)
+        if self._unsaved >= MANIFEST_SAVE_EVERY:
+            save_manifest(self.manifest, self.manifest_file)
+            self._unsaved = 0
+        if self.on_stored:
+            self.on_stored(batch)
+
+    def run(self, apps):
+        """Upload only the rows of `apps` that need it."""
+        print(f"Uploading in batches of {self.batch_size} with {self.uploader.workers} workers...")
+        try:
+            self.uploader.run(iter_batches(self.rows(apps), self.batch_size))
+        finally:
+            save_manifest(self.manifest, self.manifest_file)
+
+    def report(self):
+        """Reconcile what was read against what was stored."""
+        uploader = self.uploader
+        print(f"  Read: {self.read_count}")
+        print(f"  Unchanged (skipped): {self.unchanged_count}")
+        print(f"  Sent as new applicants: {self.inserted_count}")
+        print(f"  Upserted: {uploader.upserted}")
+        print(f"  Failed: {uploader.dead_lettered}" + (f" (see {uploader.dead_letter_file})" if uploader.dead_lettered else ""))
+        print(f"  Throughput: {uploader.throughput():.1f} rows/s")
+        missing = self.read_count - self.unchanged_count - uploader.upserted - uploader.dead_lettered
+        if missing:
+            print(f"  Warning: {missing} rows are unaccounted for.")
         try:
-            supabase.table("applicants").upsert(batch).execute()
+            count_response = get_client().table("applicants").select("id", count="exact").eq("workspace_id", self.workspace_id).limit(1).execute()
+            print(f"  Applicants in workspace now: {count_response.count}")
         except Exception as e:
-            print(f"Error inserting final batch: {e}")
+            print(f"  Could not count applicants in the database: {e}")
+
+
+def migrate_data(batch_size=BATCH_SIZE, workers=UPLOAD_WORKERS, dead_letter_file=DEAD_LETTER_FILE,
+                 manifest_file=MANIFEST_FILE, full=False, json_file=JSON_FILE):
+    print("Starting migration...")
+    sync = ApplicantSync(batch_size, workers, dead_letter_file, manifest_file, full)
+    if not sync.prepare():
+        return
+
+    # 3. Read JSON data
+    json_path = pathlib.Path(json_file)
+    if not json_path.exists():
+        print(f"Error: JSON file not found at {json_path}")
+        return
+
+    # Records are streamed so memory use does not grow with the file
+    print(f"Reading data from {json_path}...")
+    sync.run(iter_records(str(json_path)))
 
     print("Migration completed.")
+    sync.report()
 
 if __name__ == "__main__":
-    migrate_data()
+    parser = argparse.ArgumentParser(description="Upsert processed applications into the applicants table.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=UPLOAD_WORKERS, help="Batches uploaded concurrently")
+    parser.add_argument('--dead-letter', default=str(DEAD_LETTER_FILE), help="Where rows that cannot be stored are written")
+    parser.add_argument('--manifest', default=str(MANIFEST_FILE), help="Content hashes of rows already migrated")
+    parser.add_argument('--full', action='store_true', help="Ignore the manifest and resend every row")
+    parser.add_argument('--input', default=str(JSON_FILE), help="Processed applications to upload")
+    args = parser.parse_args()
+    migrate_data(args.batch_size, args.workers, args.dead_letter, args.manifest, args.full, args.input)
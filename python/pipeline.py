@@ -0,0 +1,103 @@
+import queue
+import time
+from threading import Thread
+
+from run_metrics import metrics
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a StagedPipeline.
+
+    `handler(item)` returns `(next_stage, item)`, where `next_stage` is the name
+    of a later stage or None to hand the item to the result consumer. Each
+    stage reads from its own bounded queue, so a slow stage blocks the stages
+    feeding it instead of letting work pile up in memory.
+    """
+
+    def __init__(self, name, handler, workers, queue_size=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size or workers * 2)
+        self.threads = []
+
+
+class StagedPipeline:
+    """Runs items through a fixed sequence of thread-backed stages."""
+
+    def __init__(self, stages, result_queue_size=100, on_error=None):
+        self.stages = stages
+        self._by_name = {stage.name: stage for stage in stages}
+        self._results = queue.Queue(maxsize=result_queue_size)
+        self.on_error = on_error
+        self._feed_error = None
+
+    def _worker(self, index, stage):
+        later = {s.name for s in self.stages[index + 1:]}
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                return
+            start = time.monotonic()
+            try:
+                next_stage, result = stage.handler(item)
+                if next_stage is None:
+                    target = self._results
+                elif next_stage in later:
+                    target = self._by_name[next_stage].queue
+                else:
+                    raise ValueError(f"Stage '{stage.name}' cannot route to '{next_stage}'")
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(stage.name, item, e)
+                continue
+            finally:
+                # Busy time per stage gives its utilization in the run report
+                metrics.inc('stage_busy_seconds', time.monotonic() - start, stage=stage.name)
+                metrics.inc('stage_items_total', stage=stage.name)
+            target.put(result)
+
+    def _feed(self, items):
+        first = self.stages[0]
+        try:
+            for item in items:
+                first.queue.put(item)
+        except Exception as e:
+            # Raised again by run() once the items already fed have finished
+            self._feed_error = e
+        finally:
+            # Close stages in order once everything upstream has drained
+            for stage in self.stages:
+                for _ in stage.threads:
+                    stage.queue.put(_DONE)
+                for thread in stage.threads:
+                    thread.join()
+            self._results.put(_DONE)
+
+    def run(self, items):
+        """Yield finished items as they leave the pipeline, then raise any error from reading `items`."""
+        for index, stage in enumerate(self.stages):
+            metrics.register_stage(stage.name, stage.workers)
+            for n in range(stage.workers):
+                thread = Thread(target=self._worker, args=(index, stage), name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                stage.threads.append(thread)
+
+        feeder = Thread(target=self._feed, args=(items,), name="feeder", daemon=True)
+        feeder.start()
+
+        while True:
+            result = self._results.get()
+            if result is _DONE:
+                break
+            yield result
+        feeder.join()
+        if self._feed_error:
+            raise self._feed_error
+
+    def queue_depths(self):
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
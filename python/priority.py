@@ -0,0 +1,205 @@
+import heapq
+import json
+import os
+import time
+from datetime import datetime
+from itertools import count
+from threading import Condition, Thread
+
+from run_metrics import metrics
+
+# job_id -> priority, e.g. {"16941": "urgent", "17002": 1}
+JOB_PRIORITY_FILE = 'job_priorities.json'
+# Column of the jobs table read with --job-priorities-from-db
+JOB_PRIORITY_COLUMN = 'priority'
+# Named priorities accepted in the file and the jobs table, besides plain numbers
+PRIORITY_LABELS = {'low': -1, 'normal': 0, 'high': 1, 'urgent': 2}
+
+RECENCY_WEIGHT = 1.0
+JOB_WEIGHT = 1.0
+# Earlier failures often fail again, so by default they wait behind fresh work
+RETRY_WEIGHT = -0.5
+# An application this many days old gets half the recency score of a new one
+RECENCY_HALF_LIFE_DAYS = 7
+
+# Applications held back for reordering; the rest wait in the input
+PRIORITY_WINDOW = 20000
+# Time-to-result spans the whole backlog, not one request
+TIME_TO_RESULT_BUCKETS = (1, 5, 15, 60, 300, 900, 1800, 3600, 7200, 14400, 43200)
+
+
+def parse_priority(value):
+    """Turn a number or a label like 'urgent' into a number (None if neither)."""
+    if isinstance(value, str):
+        label = value.strip().lower()
+        if label in PRIORITY_LABELS:
+            return PRIORITY_LABELS[label]
+        try:
+            return float(label)
+        except ValueError:
+            return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _normalize(priorities):
+    normalized = {}
+    for job_id, value in priorities.items():
+        priority = parse_priority(value)
+        if priority is None:
+            print(f"  Ignoring priority {value!r} for job {job_id}")
+            continue
+        normalized[str(job_id).strip()] = priority
+    return normalized
+
+
+def load_job_priorities(path=JOB_PRIORITY_FILE, from_jobs_table=False, column=JOB_PRIORITY_COLUMN):
+    """
+    Read job priorities from a local JSON file and, if asked, the jobs table.
+
+    Entries in the file override the table, so a recruiter can bump a job
+    for one run without touching the database.
+    """
+    priorities = {}
+    if from_jobs_table:
+        # Only needed here, and it pulls in the Supabase client
+        from migrate_applicants import get_client
+        try:
+            rows = get_client().table('jobs').select(f'job_id,{column}').execute().data
+        except Exception as e:
+            print(f"  Could not read job priorities from the jobs table: {e}")
+        else:
+            priorities.update(_normalize({row['job_id']: row.get(column) for row in rows}))
+
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            priorities.update(_normalize(json.load(f)))
+    return priorities
+
+
+class PriorityScorer:
+    """
+    Scores applications so the ones recruiters care about are analyzed first.
+
+    The score is a weighted sum of how recent the application is (1 when new,
+    halving every `half_life_days`), the priority of its job and whether it
+    is a retry of an earlier failure. Weights of 0 drop a term.
+    """
+
+    def __init__(self, job_priorities=None, retry_ids=None, recency_weight=RECENCY_WEIGHT,
+                 job_weight=JOB_WEIGHT, retry_weight=RETRY_WEIGHT, half_life_days=RECENCY_HALF_LIFE_DAYS):
+        self.job_priorities = job_priorities or {}
+        self.retry_ids = retry_ids or set()
+        self.recency_weight = recency_weight
+        self.job_weight = job_weight
+        self.retry_weight = retry_weight
+        self.half_life = half_life_days * 24 * 60 * 60
+
+    def job_priority(self, app):
+        return self.job_priorities.get(str(app.get('job_id')).strip(), 0)
+
+    def recency(self, app, now=None):
+        try:
+            applied = datetime.fromisoformat(app['date'])
+        except (KeyError, TypeError, ValueError):
+            return 0.0
+        now = now or (datetime.now(applied.tzinfo) if applied.tzinfo else datetime.now())
+        age = max((now - applied).total_seconds(), 0)
+        return 0.5 ** (age / self.half_life)
+
+    def score(self, app):
+        return (self.recency_weight * self.recency(app)
+                + self.job_weight * self.job_priority(app)
+                + self.retry_weight * (app['id'] in self.retry_ids))
+
+    def tier(self, app):
+        """Label for the time-to-result metrics."""
+        if app['id'] in self.retry_ids:
+            return 'retry'
+        return 'priority' if self.job_priority(app) > 0 else 'normal'
+
+
+class PriorityFeed:
+    """
+    Reorders a stream of applications so the highest scores come out first.
+
+    A background thread reads `items` into a heap of up to `window`
+    applications, kept as compact JSON, and iterating the feed pops the best
+    one. The pipeline's own queues stay small, so an urgent application
+    only waits for the work already in flight, not for the whole backlog.
+    `items` may block (e.g. a fetch queue); the feed hands out whatever it
+    has read so far. Once `stop` is set it hands out nothing more, and the
+    buffered applications are left for the next run.
+    """
+
+    def __init__(self, items, scorer, window=PRIORITY_WINDOW, stop=None):
+        self.scorer = scorer
+        self.window = window
+        self.stop = stop
+        self._heap = []
+        self._order = count()
+        self._cond = Condition()
+        self._reading = True
+        self._closed = False
+        self._error = None
+        # Application id -> (tier, time it was read), until its result is in
+        self._read_at = {}
+        self.stats = {'read': 0, 'max_buffered': 0}
+        self._reader = Thread(target=self._read, args=(items,), name="priority-reader", daemon=True)
+        self._reader.start()
+
+    def _read(self, items):
+        try:
+            for app in items:
+                score = self.scorer.score(app)
+                tier = self.scorer.tier(app)
+                with self._cond:
+                    while len(self._heap) >= self.window and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    # Ties keep input order
+                    heapq.heappush(self._heap, (-score, next(self._order), json.dumps(app, separators=(',', ':'))))
+                    self._read_at[app['id']] = (tier, time.monotonic())
+                    self.stats['read'] += 1
+                    self.stats['max_buffered'] = max(self.stats['max_buffered'], len(self._heap))
+                    self._cond.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            with self._cond:
+                self._reading = False
+                self._cond.notify_all()
+
+    def __iter__(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._heap and self._reading:
+                        self._cond.wait()
+                    if not self._heap or (self.stop and self.stop.is_set()):
+                        break
+                    _, _, data = heapq.heappop(self._heap)
+                    self._cond.notify_all()
+                yield json.loads(data)
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+        if self._error:
+            raise self._error
+
+    def finished(self, app):
+        """Record how long a finished application waited since it was read."""
+        entry = self._read_at.pop(app['id'], None)
+        if entry:
+            tier, read_at = entry
+            metrics.observe('time_to_result_seconds', time.monotonic() - read_at,
+                            buckets=TIME_TO_RESULT_BUCKETS, tier=tier)
+
+    def report(self):
+        print("Priority scheduling stats:")
+        print(f"  Applications read: {self.stats['read']} (at most {self.stats['max_buffered']} buffered)")
+        print(f"  Job priorities configured: {len(self.scorer.job_priorities)}")
+        print(f"  Retries of earlier failures: {len(self.scorer.retry_ids)}")
@@ -1,51 +1,143 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
+import argparse
 import os
 import io
 from pypdf import PdfReader
 import time
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from batch_analysis import MicroBatcher
+from checkpoint_store import CheckpointStore
+from dedupe_index import DedupeIndex, MATCH_MODES
+from local_extract import EXTRACT_MODES, LocalExtractor
+from pipeline import Stage, StagedPipeline
+from priority import (JOB_PRIORITY_FILE, JOB_WEIGHT, RECENCY_HALF_LIFE_DAYS, RECENCY_WEIGHT, RETRY_WEIGHT,
+                      PriorityFeed, PriorityScorer, load_job_priorities)
+from records import iter_records
+from rate_limit import AdaptiveController, RetryPolicy, is_overload_status, parse_retry_after
+from resume_cache import ResumeCache
+from resume_text import MAX_TEXT_CHARS, PAGE_BREAK, TextPrefilter
+from run_metrics import metrics
 
 # Configuration
 INPUT_FILE = 'fetched_applications.json'
 OUTPUT_FILE = 'processed_applications.json'
+# Merge the checkpoint log into OUTPUT_FILE after this many new records
+COMPACT_EVERY = 500
+# Downloads and webhook calls are I/O bound; parsing is CPU bound and runs in processes
+DOWNLOAD_WORKERS = 20
+PARSE_WORKERS = os.cpu_count() or 1
+ANALYSIS_WORKERS = 20
+# Webhook responses slower than this shrink the concurrency limit
+WEBHOOK_LATENCY_TARGET = 90
+# How long to keep retrying an overloaded webhook before recording an error
+MAX_OVERLOAD_WAIT = 30 * 60
+# Machine-readable summary of every run
+RUN_REPORT_FILE = 'run_report.json'
 API_URL = 'https://n8n.ankitdalal.com/webhook/fbd26858-3fc7-4a73-9130-29baf371f39b'
 
-def load_json(filepath):
-    if not os.path.exists(filepath):
-        return []
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
+# Shared across worker threads; downloads and parsed text persist between runs.
+# Opened by open_resume_cache, not at import: parse workers import this module
+# under spawn and must not scan or evict the cache the parent is using.
+resume_cache = None
 
-def save_json(filepath, data):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+# Normalizes and caps resume text before it is sent for analysis
+text_prefilter = TextPrefilter(MAX_TEXT_CHARS)
+# Regex extraction of the mechanical ai_data fields; off unless asked for
+local_extractor = LocalExtractor('off')
 
-def extract_text_from_pdf(pdf_url):
-    max_retries = 3
+# One keep-alive connection pool for resume downloads and webhook calls
+http = requests.Session()
+http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=DOWNLOAD_WORKERS + ANALYSIS_WORKERS))
+http.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=DOWNLOAD_WORKERS + ANALYSIS_WORKERS))
+
+retry_policy = RetryPolicy(max_attempts=3, base_delay=2, max_delay=60)
+# Adapts how many webhook calls run at once and pauses the run if it is saturated
+webhook_limiter = AdaptiveController(
+    'Analysis API',
+    initial_limit=ANALYSIS_WORKERS,
+    max_limit=ANALYSIS_WORKERS,
+    latency_target=WEBHOOK_LATENCY_TARGET,
+)
+
+def iter_pending(processed_ids):
+    """Stream fetched applications that have not been processed yet."""
+    for app in iter_records(INPUT_FILE):
+        if app['id'] not in processed_ids:
+            yield app
+
+def download_resume(pdf_url, pin=False):
+    """Download (or revalidate) a resume PDF and return its content hash; `pin` as in ResumeCache.fetch."""
+    max_retries = retry_policy.max_attempts
     for attempt in range(max_retries):
         try:
             headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(pdf_url, headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            with io.BytesIO(response.content) as f:
-                reader = PdfReader(f)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+            return resume_cache.fetch(pdf_url, headers=headers, timeout=30, session=http, pin=pin)
         except Exception as e:
-            print(f"  Error extracting PDF text from {pdf_url} (Attempt {attempt+1}/{max_retries}): {e}")
+            print(f"  Error downloading PDF from {pdf_url} (Attempt {attempt+1}/{max_retries}): {e}")
             if attempt < max_retries - 1:
-                time.sleep(2)
+                metrics.inc('download_retries_total')
+                response = getattr(e, 'response', None)
+                retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+                time.sleep(retry_policy.backoff(attempt, retry_after))
+    metrics.inc('download_failures_total')
     return None
 
+def parse_pdf_text(content):
+    """Extract the text of every page. CPU bound, so it runs in a worker process."""
+    with io.BytesIO(content) as f:
+        reader = PdfReader(f)
+        # Page breaks are kept so the prefilter can spot repeated headers/footers
+        return PAGE_BREAK.join(page.extract_text() + "\n" for page in reader.pages)
+
+def parse_pdf_file(path):
+    """
+    Parse a cached PDF and return (text, pages, seconds), timed inside the worker process.
+    
+    Workers are handed the path rather than the bytes, so PDFs are never held
+    in or pickled from the main process.
+    """
+    start = time.process_time()
+    with open(path, 'rb') as f:
+        text = parse_pdf_text(f.read())
+    return text, text.count(PAGE_BREAK) + 1, time.process_time() - start
+
+def record_parse(pages, seconds):
+    metrics.observe('parse_seconds', seconds)
+    metrics.observe('parse_seconds_per_page', seconds / pages)
+    metrics.inc('parse_pages_total', pages)
+
+def open_resume_cache():
+    """Create the shared resume cache on first use."""
+    global resume_cache
+    if resume_cache is None:
+        resume_cache = ResumeCache()
+    return resume_cache
+
+def extract_text_from_pdf(pdf_url):
+    open_resume_cache()
+    sha = download_resume(pdf_url, pin=True)
+    if not sha:
+        return None
+    
+    try:
+        # The same resume uploaded under another URL is only parsed once
+        text = resume_cache.read_text(sha)
+        if text is None:
+            try:
+                text, pages, seconds = parse_pdf_file(resume_cache.pdf_path(sha))
+            except Exception as e:
+                print(f"  Error extracting PDF text from {pdf_url}: {e}")
+                return None
+            record_parse(pages, seconds)
+            resume_cache.write_text(sha, text)
+    finally:
+        resume_cache.unpin(sha)
+    return text
+
 def clean_json_string(json_str):
     # Remove markdown code blocks
     cleaned = re.sub(r'^```json\s*', '', json_str, flags=re.MULTILINE)
@@ -53,143 +145,472 @@ def clean_json_string(json_str):
     cleaned = re.sub(r'```$', '', cleaned, flags=re.MULTILINE)
     return cleaned.strip()
 
-def analyze_resume(text, applicant_info):
+def build_analysis_input(text, applicant_info):
     # Construct the input string as requested
     # "Name \n Email | LinkedIn | Mobile \n\n Text"
     header = f"{applicant_info.get('name', '')}\n{applicant_info.get('email', '')} | {applicant_info.get('linkedin', '') or ''} | {applicant_info.get('mobile_number', '')}\n\n"
-    full_input = header + text
+    return header + text
+
+def parse_analysis_output(result):
+    """Turn the webhook's JSON body into the analysis dict, or None if it is empty."""
+    # Handle case where result is a list
+    if isinstance(result, list):
+        if len(result) > 0:
+            result = result[0]
+        else:
+            print("  API returned empty list")
+            return None
+            
+    output_str = result.get('output', '')
     
-    max_retries = 3
-    for attempt in range(max_retries):
+    # Parse the inner JSON
+    cleaned_output = clean_json_string(output_str)
+    return json.loads(cleaned_output)
+
+def parse_batch_output(result):
+    """
+    Map a batch response onto {application id: analysis dict}.
+    
+    The webhook answers a batch with a list of {"id": ..., "output": ...}
+    items, each holding the same output as a single request. Items that are
+    missing or cannot be parsed are left out, so they get retried alone.
+    """
+    analyses = {}
+    if not isinstance(result, list):
+        return analyses
+    for item in result:
+        try:
+            analysis = parse_analysis_output(item)
+        except Exception:
+            continue
+        if isinstance(item, dict) and 'id' in item and isinstance(analysis, dict):
+            analyses[str(item['id'])] = analysis
+    return analyses
+
+def call_analysis_api(parse, **request_kwargs):
+    """POST to the analysis webhook with adaptive limiting and retries; returns parse(body) or None."""
+    max_retries = retry_policy.max_attempts
+    attempt = 0
+    overload_attempt = 0
+    give_up_at = time.monotonic() + MAX_OVERLOAD_WAIT
+    response = None
+    while attempt < max_retries:
+        overloaded = False
+        retry_after = None
+        outcome = 'error'
+        webhook_limiter.acquire()
+        start = time.monotonic()
         try:
-            response = requests.post(API_URL, data={'input': full_input}, timeout=120)
+            response = http.post(API_URL, timeout=120, **request_kwargs)
+            overloaded = is_overload_status(response.status_code)
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
             response.raise_for_status()
-            
-            result = response.json()
-            
-            # Handle case where result is a list
-            if isinstance(result, list):
-                if len(result) > 0:
-                    result = result[0]
-                else:
-                    print("  API returned empty list")
-                    return None
-                    
-            output_str = result.get('output', '')
-            
-            # Parse the inner JSON
-            cleaned_output = clean_json_string(output_str)
-            return json.loads(cleaned_output)
-            
+            result = parse(response.json())
+            outcome = 'ok'
+            return result
+        except (requests.Timeout, requests.ConnectionError) as e:
+            overloaded = True
+            error = e
         except Exception as e:
-            print(f"  Error calling analysis API (Attempt {attempt+1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                try:
-                    print(f"  Raw response: {response.text[:200]}...")
-                except:
-                    pass
-            else:
-                time.sleep(2)
+            error = e
+        finally:
+            latency = time.monotonic() - start
+            webhook_limiter.release(overloaded, latency, retry_after)
+            metrics.observe('webhook_seconds', latency, outcome='overloaded' if overloaded else outcome)
+        
+        # Overload does not use up attempts; the limiter pauses callers instead
+        if overloaded and time.monotonic() < give_up_at:
+            metrics.inc('webhook_retries_total', reason='overload')
+            print(f"  Analysis API overloaded, backing off: {error}")
+            time.sleep(retry_policy.backoff(overload_attempt, retry_after))
+            overload_attempt += 1
+            continue
+        
+        attempt += 1
+        print(f"  Error calling analysis API (Attempt {attempt}/{max_retries}): {error}")
+        if attempt == max_retries:
+            try:
+                print(f"  Raw response: {response.text[:200]}...")
+            except:
+                pass
+        else:
+            metrics.inc('webhook_retries_total', reason='error')
+            time.sleep(retry_policy.backoff(attempt - 1))
                 
     return None
 
-def process_single_application(app, index, total, processed_ids, save_lock):
-    """Process a single application with PDF extraction and API analysis."""
-    if app['id'] in processed_ids:
-        return None
-        
-    print(f"Processing {index+1}/{total}: ID {app['id']} - {app['name']}")
-    
-    resume_url = app.get('resume_id')
-    if not resume_url:
-        print("  No resume URL found. Skipping analysis.")
-        app['analysis'] = None
-        return app
-        
-    # 1. Extract Text
-    print("  Downloading and extracting PDF text...")
-    pdf_text = extract_text_from_pdf(resume_url)
-    
+def analyze_resume(text, applicant_info):
+    full_input = build_analysis_input(text, applicant_info)
+    return call_analysis_api(parse_analysis_output, data={'input': full_input})
+
+def send_analysis_batch(items):
+    """Analyze several resumes in one request; items are (id, (text, app)) pairs."""
+    batch = [{'id': key, 'input': build_analysis_input(text, app)} for key, (text, app) in items]
+    return call_analysis_api(parse_batch_output, data={'batch': json.dumps(batch)})
+
+def make_batcher(max_items):
+    return MicroBatcher(
+        send_batch=send_analysis_batch,
+        fallback=lambda key, job: analyze_resume(*job),
+        max_items=max_items,
+        # Enough senders to keep every analysis worker's item moving
+        workers=-(-ANALYSIS_WORKERS // max_items),
+    )
+
+def analyze(text, app, batcher=None):
+    """Analyze one resume, through the micro-batcher when batch mode is on."""
+    if batcher is None:
+        return analyze_resume(text, app)
+    return batcher.submit(str(app['id']), (text, app), len(text)).result()
+
+def prepare_analysis_text(text, app):
+    """Prefilter resume text for analysis and record its size before and after."""
+    filtered = text_prefilter.apply(text)
+    app['resume_text_chars'] = len(text)
+    app['analysis_text_chars'] = len(filtered)
+    return filtered
+
+def analyze_application(app, pdf_text, batcher=None):
+    """Run the analysis for one application and record the result or error on it."""
+    if pdf_text:
+        pdf_text = prepare_analysis_text(pdf_text, app)
     if not pdf_text:
-        print("  Failed to extract text.")
+        print(f"  Failed to extract text for ID {app['id']}.")
         app['analysis_error'] = "Failed to extract PDF text"
         return app
-        
-    # 2. Analyze
-    print("  Analyzing with API...")
-    analysis_result = analyze_resume(pdf_text, app)
-    
+
+    extraction = local_extractor.extract(pdf_text) if local_extractor.enabled else None
+    if extraction and local_extractor.skip_webhook(extraction):
+        print(f"  Extracted ID {app['id']} locally, skipping the API.")
+        app['ai_data'] = local_extractor.local_analysis(app, extraction)
+        return app
+
+    print(f"  Analyzing ID {app['id']} with API...")
+    analysis_result = analyze(pdf_text, app, batcher)
+
     if analysis_result:
-        print("  Analysis successful.")
-        # Merge analysis result into the app object or as a sub-object
-        # The user asked to "add to th repetive array", implying merging or adding fields.
-        # I'll add it as a 'parsed_data' field to keep it clean, or merge it.
-        # Looking at the requested output structure, it has fields like 'skills', 'projects' etc.
-        # It's safer to add it as a nested object 'ai_analysis' to avoid overwriting original fields like 'id' or 'name' if the AI hallucinates them differently.
-        # BUT user said "store in anew json file old and this new".
-        # I will merge it at top level but be careful, OR just put it in 'ai_enriched_data'.
-        # Let's put it in 'ai_data' key.
+        print(f"  Analysis successful for ID {app['id']}.")
+        if extraction:
+            local_extractor.complete(app, extraction, analysis_result)
+        # Stored under 'ai_data' rather than merged at top level so the AI
+        # cannot overwrite original fields like 'id' or 'name'.
         app['ai_data'] = analysis_result
     else:
-        print("  Analysis failed.")
+        print(f"  Analysis failed for ID {app['id']}.")
         app['analysis_error'] = "API analysis failed"
-        
-    print("  Processed successfully.")
     return app
 
-def main():
-    print("Starting application processing with concurrent workers (max 20)...")
-    
-    fetched_data = load_json(INPUT_FILE)
-    processed_data = load_json(OUTPUT_FILE)
+def build_dedupe_index(store, mode):
+    """Index earlier analyses so repeat applicants can reuse them."""
+    dedupe = DedupeIndex(mode)
+    if dedupe.keys:
+        for record in store.iter_processed():
+            dedupe.add(record, resume_cache.cached_hash(record.get('resume_id')))
+    return dedupe
+
+class Job:
+    """
+    An application moving between pipeline stages.
     
-    # Create a map of already processed IDs for fast lookup
-    processed_ids = {item['id'] for item in processed_data}
+    Slots keep the per-item overhead small, and the stage that consumes the
+    resume text takes it off the job, so nothing holds the raw text while
+    the analysis waits on the webhook.
+    """
     
-    print(f"Found {len(fetched_data)} total applications.")
-    print(f"Found {len(processed_data)} already processed.")
+    __slots__ = ('app', 'sha', 'text')
     
-    # Filter out already processed applications
-    to_process = [app for app in fetched_data if app['id'] not in processed_ids]
-    print(f"Applications to process: {len(to_process)}")
+    def __init__(self, app, sha, text=None):
+        self.app = app
+        self.sha = sha
+        self.text = text
     
-    if not to_process:
-        print("No new applications to process.")
-        return
+    def take_text(self):
+        text, self.text = self.text, None
+        return text
+
+def build_pipeline(total, parse_pool, batcher=None, dedupe=None):
+    """
+    Download -> parse -> analyze, each stage with its own workers and queue.
     
-    # Thread-safe lock for saving data
-    save_lock = Lock()
-    
-    # Process applications concurrently with max 20 workers
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        # Submit all tasks
-        future_to_app = {
-            executor.submit(
-                process_single_application, 
-                app, 
-                i, 
-                len(to_process), 
-                processed_ids,
-                save_lock
-            ): app 
-            for i, app in enumerate(to_process)
-        }
+    Resumes whose text is already cached skip the parse stage. Applications
+    that cannot be analyzed leave the pipeline early with an error recorded.
+    """
+    counter = count(1)
+    dedupe = dedupe or DedupeIndex('off')
+
+    def download_stage(app):
+        print(f"Processing {next(counter)}{f'/{total}' if total else ''}: ID {app['id']} - {app['name']}")
         
-        # Process completed tasks as they finish
-        for future in as_completed(future_to_app):
+        resume_url = app.get('resume_id')
+        if not resume_url:
+            print("  No resume URL found. Skipping analysis.")
+            app['analysis'] = None
+            return None, app
+        
+        if dedupe.match_contact(app):
+            print(f"  Reusing analysis of ID {app['duplicate_of']} (same candidate).")
+            return None, app
+        
+        # Pinned so eviction cannot remove the PDF while it waits for a parse worker
+        sha = download_resume(resume_url, pin=True)
+        if not sha:
+            print("  Failed to download resume.")
+            app['analysis_error'] = "Failed to extract PDF text"
+            return None, app
+        
+        needs_parse = False
+        try:
+            if dedupe.match_resume(app, sha):
+                print(f"  Reusing analysis of ID {app['duplicate_of']} (same resume).")
+                return None, app
+            
+            text = resume_cache.read_text(sha)
+            if text is not None:
+                return 'analysis', Job(app, sha, text)
+            needs_parse = True
+            return 'parse', Job(app, sha)
+        finally:
+            if not needs_parse:
+                resume_cache.unpin(sha)
+
+    def parse_stage(job):
+        try:
             try:
-                result = future.result()
-                if result:
-                    # Thread-safe save
-                    with save_lock:
-                        processed_data.append(result)
-                        save_json(OUTPUT_FILE, processed_data)
-                        processed_ids.add(result['id'])
+                text, pages, seconds = parse_pool.submit(parse_pdf_file, resume_cache.pdf_path(job.sha)).result()
             except Exception as e:
-                app = future_to_app[future]
-                print(f"Error processing application {app['id']}: {e}")
+                print(f"  Error extracting PDF text for ID {job.app['id']}: {e}")
+                job.app['analysis_error'] = "Failed to extract PDF text"
+                dedupe.finish(job.app, job.sha)
+                return None, job.app
+            record_parse(pages, seconds)
+            resume_cache.write_text(job.sha, text)
+        finally:
+            # Pinned by the download stage; the cached text is enough from here
+            resume_cache.unpin(job.sha)
+        job.text = text
+        return 'analysis', job
+
+    def analysis_stage(job):
+        try:
+            return None, analyze_application(job.app, job.take_text(), batcher)
+        finally:
+            # Lets waiting applications with the same resume move on
+            dedupe.finish(job.app, job.sha)
+
+    def on_error(stage_name, job, e):
+        app = job.app if isinstance(job, Job) else job
+        print(f"Error processing application {app['id']} in {stage_name} stage: {e}")
+        if stage_name == 'parse':
+            dedupe.finish(app, job.sha)
+
+    stages = [
+        Stage('download', download_stage, DOWNLOAD_WORKERS),
+        Stage('parse', parse_stage, PARSE_WORKERS),
+        Stage('analysis', analysis_stage, ANALYSIS_WORKERS),
+    ]
+    return StagedPipeline(stages, on_error=on_error)
+
+def result_outcome(app):
+    """Label a finished application for the run metrics."""
+    if 'analysis_error' in app:
+        return 'error'
+    if 'duplicate_of' in app:
+        return 'duplicate'
+    if 'ai_data' in app:
+        return 'analyzed'
+    return 'no_resume'
 
+def main(engine='threads', batch_size=0, dedupe_mode='resume', max_text_chars=MAX_TEXT_CHARS, local_mode='off',
+         report_file=RUN_REPORT_FILE, prometheus_file=None, priority=None, retry_failed=False):
+    """
+    Process every fetched application that is not in the output file yet.
+
+    `priority` is an optional PriorityScorer that decides which applications
+    go first. With `retry_failed`, applications whose stored result is an
+    analysis error are processed again.
+    """
+    text_prefilter.max_chars = max_text_chars
+    local_extractor.mode = local_mode
+    metrics.start()
+    if engine == 'asyncio':
+        print("Starting application processing with the asyncio engine...")
+    else:
+        print(f"Starting application processing ({DOWNLOAD_WORKERS} download, {PARSE_WORKERS} parse, {ANALYSIS_WORKERS} analysis workers)...")
+    
+    store = CheckpointStore(OUTPUT_FILE, compact_every=COMPACT_EVERY)
+    
+    # Rebuild processed IDs from the output file plus any checkpointed records
+    processed_ids = store.load_processed_ids()
+    if retry_failed:
+        failed_ids = store.load_failed_ids()
+        processed_ids -= failed_ids
+        print(f"Retrying {len(failed_ids)} applications that failed before.")
+        if priority:
+            priority.retry_ids = failed_ids
+    
+    # Count in a streaming pass; applications are read again as they are processed
+    total_count = 0
+    pending_count = 0
+    for app in iter_records(INPUT_FILE):
+        total_count += 1
+        if app['id'] not in processed_ids:
+            pending_count += 1
+    
+    print(f"Found {total_count} total applications.")
+    print(f"Found {len(processed_ids)} already processed.")
+    print(f"Applications to process: {pending_count}")
+    
+    if not pending_count:
+        print("No new applications to process.")
+        # Fold in anything an interrupted run left in the checkpoint log
+        store.close()
+        return
+    
+    def save_result(result):
+        # Constant-cost append; the full JSON file is only
+        # rewritten on compaction
+        store.append(result)
+        processed_ids.add(result['id'])
+        metrics.inc('applications_total', outcome=result_outcome(result))
+    
+    process_stream(iter_pending(processed_ids), save_result, store, total=pending_count,
+                   engine=engine, batch_size=batch_size, dedupe_mode=dedupe_mode, priority=priority)
+    store.close()
+    write_run_report(report_file, prometheus_file, engine=engine, batch_size=batch_size, dedupe=dedupe_mode,
+                     max_text_chars=max_text_chars, local_extract=local_mode, applications=pending_count)
     print("Processing complete.")
 
+def process_stream(apps, on_result, store, total=None, engine='threads', batch_size=0, dedupe_mode='resume',
+                   priority=None, stop=None):
+    """
+    Download, parse and analyze `apps`, calling `on_result` with each finished application.
+    
+    `apps` is consumed lazily and may still be growing, e.g. records coming
+    off a fetch queue, so only a bounded number are in flight at a time.
+    `store` holds earlier results and seeds duplicate detection. With a
+    `priority` scorer the highest-scoring applications read so far go first;
+    setting `stop` then leaves the ones still waiting for the next run.
+    """
+    open_resume_cache()
+    dedupe = build_dedupe_index(store, dedupe_mode)
+
+    feed = None
+    if priority:
+        feed = PriorityFeed(apps, priority, stop=stop)
+        apps = feed
+        save = on_result
+
+        def on_result(result):
+            save(result)
+            feed.finished(result)
+    
+    # Several resumes per webhook request when batch mode is on
+    batcher = make_batcher(batch_size) if batch_size > 1 else None
+    
+    try:
+        with ProcessPoolExecutor(max_workers=PARSE_WORKERS) as parse_pool:
+            if engine == 'asyncio':
+                from async_engine import run_async
+                async_engine = run_async(
+                    apps,
+                    on_result,
+                    total=total,
+                    api_url=API_URL,
+                    cache=resume_cache,
+                    parse_fn=parse_pdf_file,
+                    record_parse=record_parse,
+                    parse_workers=PARSE_WORKERS,
+                    build_input=build_analysis_input,
+                    parse_output=parse_analysis_output,
+                    parse_pool=parse_pool,
+                    retry_policy=retry_policy,
+                    max_overload_wait=MAX_OVERLOAD_WAIT,
+                    batcher=batcher,
+                    dedupe=dedupe,
+                    prepare_text=prepare_analysis_text,
+                    local_extractor=local_extractor if local_extractor.enabled else None,
+                )
+                # Batched requests go out through the threaded limiter
+                limiter = webhook_limiter if batcher else async_engine.webhook_limiter
+            else:
+                pipeline = build_pipeline(total, parse_pool, batcher, dedupe)
+                metrics.start_sampler('queue_depth', pipeline.queue_depths)
+                metrics.start_sampler('webhook_concurrency', lambda: {
+                    'limit': webhook_limiter.limit, 'in_flight': webhook_limiter.in_flight})
+                for result in pipeline.run(apps):
+                    on_result(result)
+                limiter = webhook_limiter
+    finally:
+        metrics.stop_samplers()
+        # Even an interrupted run keeps what it cached for the next one
+        resume_cache.save()
+
+    resume_cache.report()
+    limiter.report()
+    if batcher:
+        batcher.close()
+        batcher.report()
+    dedupe.report()
+    if feed:
+        feed.report()
+    text_prefilter.report()
+    local_extractor.report()
+    resume_cache.export_metrics()
+    limiter.export_metrics('webhook')
+
+def write_run_report(report_file=RUN_REPORT_FILE, prometheus_file=None, **details):
+    """Print the run metrics and write them as JSON (and Prometheus text, if asked)."""
+    metrics.report()
+    metrics.write_json(report_file, **details)
+    print(f"Run report written to {report_file}")
+    if prometheus_file:
+        metrics.write_prometheus(prometheus_file)
+
+def add_priority_arguments(parser):
+    """CLI options for priority scheduling, shared with run_pipeline.py."""
+    parser.add_argument('--priority', action='store_true',
+                        help="Analyze recent applications, urgent jobs and first attempts before the rest")
+    parser.add_argument('--job-priorities', default=JOB_PRIORITY_FILE,
+                        help="JSON file mapping job_id to a number or low/normal/high/urgent")
+    parser.add_argument('--job-priorities-from-db', action='store_true',
+                        help="Also read job priorities from the jobs table (the file wins on conflicts)")
+    parser.add_argument('--recency-weight', type=float, default=RECENCY_WEIGHT)
+    parser.add_argument('--job-weight', type=float, default=JOB_WEIGHT)
+    parser.add_argument('--retry-weight', type=float, default=RETRY_WEIGHT)
+    parser.add_argument('--recency-half-life', type=float, default=RECENCY_HALF_LIFE_DAYS,
+                        help="Days after which an application's recency score halves")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Process applications whose stored result is an analysis error again")
+
+def priority_from_args(args):
+    if not args.priority:
+        return None
+    return PriorityScorer(
+        load_job_priorities(args.job_priorities, from_jobs_table=args.job_priorities_from_db),
+        recency_weight=args.recency_weight,
+        job_weight=args.job_weight,
+        retry_weight=args.retry_weight,
+        half_life_days=args.recency_half_life,
+    )
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Download, parse and analyze fetched applications.")
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads',
+                        help="threads: staged thread/process pipeline; asyncio: aiohttp with pooled connections")
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help="Send up to this many resumes per webhook request (the webhook must accept a 'batch' field)")
+    parser.add_argument('--dedupe', choices=sorted(MATCH_MODES), default='resume',
+                        help="Reuse earlier analyses: resume = identical resume file, contact = also same email/phone")
+    parser.add_argument('--max-text-chars', type=int, default=MAX_TEXT_CHARS,
+                        help="Cap on resume characters sent for analysis, keeping experience and skills first (0 = no cap)")
+    parser.add_argument('--local-extract', choices=list(EXTRACT_MODES), default='off',
+                        help="; ".join(f"{mode}: {meaning}" for mode, meaning in EXTRACT_MODES.items()))
+    parser.add_argument('--report', default=RUN_REPORT_FILE, help="Where to write the JSON run report")
+    parser.add_argument('--prometheus', default=None,
+                        help="Also write the run metrics in Prometheus text format to this file")
+    add_priority_arguments(parser)
+    args = parser.parse_args()
+    main(engine=args.engine, batch_size=args.batch_size, dedupe_mode=args.dedupe,
+         max_text_chars=args.max_text_chars, local_mode=args.local_extract,
+         report_file=args.report, prometheus_file=args.prometheus,
+         priority=priority_from_args(args), retry_failed=args.retry_failed)
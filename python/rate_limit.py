@@ -0,0 +1,176 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from threading import Condition
+
+from run_metrics import metrics
+
+
+def is_overload_status(status):
+    """429 and 5xx responses mean the server is overloaded and we should back off."""
+    return status == 429 or status >= 500
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before retry number `attempt` (0-based), never shorter than Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class AdaptiveController:
+    """
+    AIMD concurrency limit plus a circuit breaker for one upstream service.
+
+    Callers take a slot with `acquire()` and give it back with `release()`,
+    reporting how the call went. Successes grow the limit by one slot per
+    "window" of calls; overload responses (429/5xx, timeouts) or latency above
+    `latency_target` halve it. A Retry-After header holds back every caller,
+    not just the one that received it.
+
+    After `failure_threshold` overloads in a row the breaker opens and all
+    callers wait for `cooldown` seconds before a single probe request is let
+    through. The run pauses instead of retrying into a saturated service.
+    """
+
+    def __init__(self, name, initial_limit=20, min_limit=1, max_limit=64,
+                 latency_target=None, failure_threshold=5, cooldown=60.0):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._consecutive_overloads = 0
+        self._paused_until = 0.0
+        self._breaker_open = False
+        self._probing = False
+        self._last_decrease = 0.0
+        self._cond = Condition()
+        self.stats = {'calls': 0, 'overloads': 0, 'breaker_trips': 0, 'wait_seconds': 0.0}
+
+    def _wait_time(self, now):
+        """Seconds the caller must wait before it may start, or 0."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._breaker_open:
+            # Half-open: one probe at a time until a call succeeds
+            return 0.0 if not self._probing and self._in_flight == 0 else 0.5
+        return 0.0 if self._in_flight < int(self.limit) else None
+
+    def _try_take(self):
+        now = time.monotonic()
+        wait = self._wait_time(now)
+        if wait == 0.0:
+            if self._breaker_open:
+                self._probing = True
+            self._in_flight += 1
+            return 0.0
+        return wait
+
+    def acquire(self):
+        """Block until a slot is free and the breaker allows calls."""
+        with self._cond:
+            while True:
+                wait = self._try_take()
+                if wait == 0.0:
+                    return
+                start = time.monotonic()
+                self._cond.wait(timeout=wait)
+                self.stats['wait_seconds'] += time.monotonic() - start
+
+    async def acquire_async(self):
+        """asyncio version of `acquire`; polls because the state is shared with threads."""
+        while True:
+            with self._cond:
+                wait = self._try_take()
+            if wait == 0.0:
+                return
+            delay = min(wait, 0.5) if wait is not None else 0.05
+            self.stats['wait_seconds'] += delay
+            await asyncio.sleep(delay)
+
+    def _decrease(self):
+        # Calls that were already in flight report the same overload, so
+        # only halve once per second instead of once per response
+        now = time.monotonic()
+        if now - self._last_decrease >= 1.0:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self._last_decrease = now
+
+    def release(self, overloaded=False, latency=None, retry_after=None):
+        """Return a slot and feed the outcome of the call into the limit."""
+        with self._cond:
+            self._in_flight -= 1
+            self.stats['calls'] += 1
+            slow = self.latency_target is not None and latency is not None and latency > self.latency_target
+
+            if overloaded:
+                self.stats['overloads'] += 1
+                self._consecutive_overloads += 1
+                self._decrease()
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if self._breaker_open or self._consecutive_overloads >= self.failure_threshold:
+                    if not self._breaker_open:
+                        self.stats['breaker_trips'] += 1
+                        print(f"  [{self.name}] {self._consecutive_overloads} overloaded responses in a row, "
+                              f"pausing for {self.cooldown:.0f}s")
+                    self._breaker_open = True
+                    self._paused_until = max(self._paused_until, time.monotonic() + self.cooldown)
+                self._probing = False
+            else:
+                self._consecutive_overloads = 0
+                if self._breaker_open:
+                    print(f"  [{self.name}] Service recovered, resuming")
+                    self._breaker_open = False
+                    self._probing = False
+                if slow:
+                    self._decrease()
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
+            self._cond.notify_all()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def export_metrics(self, prefix):
+        """Copy the controller's counters into the run metrics under `prefix`."""
+        s = self.stats
+        metrics.inc(f'{prefix}_calls_total', s['calls'])
+        metrics.inc(f'{prefix}_overloads_total', s['overloads'])
+        metrics.inc(f'{prefix}_breaker_trips_total', s['breaker_trips'])
+        metrics.inc(f'{prefix}_wait_seconds_total', s['wait_seconds'])
+        metrics.set_gauge(f'{prefix}_limit', self.limit)
+
+    def report(self):
+        s = self.stats
+        print(f"{self.name} rate control: {s['calls']} calls, {s['overloads']} overloaded, "
+              f"{s['breaker_trips']} breaker trips, final limit {int(self.limit)}")
@@ -0,0 +1,143 @@
+import json
+import os
+
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\r\n'
+
+
+def _iter_json_array(f, first_chunk):
+    """Yield the items of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf = first_chunk
+    pos = buf.index('[') + 1
+    eof = False
+    while True:
+        # Move to the start of the next item, reading more input as needed
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or buf[pos] == ','):
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                raise ValueError("Unterminated JSON array")
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if buf[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            end = None
+        # An item that runs to the end of the buffer may be cut short
+        if end is None or (end == len(buf) and not eof):
+            if eof:
+                raise ValueError(f"Invalid JSON near offset {pos}")
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        yield item
+        pos = end
+        if pos >= CHUNK_SIZE:
+            buf, pos = buf[pos:], 0
+
+
+def iter_records(path):
+    """
+    Stream application records from `path`, one dict at a time.
+
+    Both a JSON array (the format the scripts have always written) and JSON
+    Lines are accepted; the format is detected from the first character. A
+    missing file yields nothing.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        first_chunk = f.read(CHUNK_SIZE)
+        stripped = first_chunk.lstrip()
+        if not stripped:
+            return
+        if stripped[0] == '[':
+            yield from _iter_json_array(f, first_chunk)
+            return
+
+        f.seek(0)
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_number} of {path}: {e}")
+
+
+class JsonArrayWriter:
+    """
+    Writes application records to a JSON array file one at a time.
+
+    The output is byte-for-byte what `json.dump(records, f, indent=4)` would
+    produce, but records never have to be held in memory together. Data goes
+    to a temporary file that replaces `path` only when the writer is closed
+    without an error, so an interrupted run leaves the previous file intact.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.count = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.tmp_path, 'w', encoding='utf-8')
+        self._fh.write('[')
+        return self
+
+    def write(self, record):
+        text = json.dumps(record, indent=4).replace('\n', '\n    ')
+        self._fh.write((',' if self.count else '') + '\n    ' + text)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._fh.close()
+            os.remove(self.tmp_path)
+            return False
+        self._fh.write('\n]' if self.count else ']')
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        os.replace(self.tmp_path, self.path)
+        return False
+
+
+class JsonlWriter(JsonArrayWriter):
+    """Same as JsonArrayWriter, but writes one compact record per line."""
+
+    def __enter__(self):
+        self._fh = open(self.tmp_path, 'w', encoding='utf-8')
+        return self
+
+    def write(self, record):
+        self._fh.write(json.dumps(record) + '\n')
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._fh.close()
+            os.remove(self.tmp_path)
+            return False
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        os.replace(self.tmp_path, self.path)
+        return False
+
+
+def open_writer(path):
+    """Return a streaming writer for `path`: JSON Lines for .jsonl, otherwise a JSON array."""
+    if path.endswith('.jsonl'):
+        return JsonlWriter(path)
+    return JsonArrayWriter(path)
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+from threading import Lock, get_ident
+
+import requests
+
+from run_metrics import metrics
+
+CACHE_DIR = '.resume_cache'
+# Upper bound for PDFs plus extracted text kept on disk
+MAX_CACHE_BYTES = 1024 * 1024 * 1024
+# Entries younger than this are reused without asking the server
+MAX_AGE_SECONDS = 24 * 60 * 60
+# Index changes between saves, so a crash loses little of what a run cached
+SAVE_EVERY = 100
+
+
+class UrlEntry:
+    """What the cache knows about one URL. There is one per application, so it uses slots, not a dict."""
+
+    __slots__ = ('sha256', 'etag', 'last_modified', 'fetched_at')
+
+    def __init__(self, sha256, etag=None, last_modified=None, fetched_at=0.0):
+        self.sha256 = sha256
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry['sha256'], entry.get('etag'), entry.get('last_modified'), entry.get('fetched_at', 0.0))
+
+    def to_dict(self):
+        return {
+            'sha256': self.sha256,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'fetched_at': self.fetched_at,
+        }
+
+
+class ResumeCache:
+    """
+    On-disk cache for resume downloads and their extracted text.
+
+    URLs map to a content hash plus the validators (ETag / Last-Modified) the
+    server sent, so stale entries are refreshed with a conditional GET. PDFs
+    and text are stored by SHA-256 of the PDF bytes, which lets the same
+    resume uploaded under different URLs share one parse. When the cache
+    grows past `max_bytes` the least recently used objects are evicted,
+    except those pinned by `pin=True` until `unpin` says their text is read.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, max_age=MAX_AGE_SECONDS, save_every=SAVE_EVERY):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.save_every = save_every
+        self._unsaved = 0
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = Lock()
+        self._urls = {}
+        # sha -> {'size': ..., 'text_size': ...}, least recently used first
+        self._objects = OrderedDict()
+        self._total_bytes = 0
+        # sha -> number of callers still reading the PDF or its text
+        self._pinned = Counter()
+        self.stats = {
+            'fresh_hits': 0,
+            'revalidated': 0,
+            'downloads': 0,
+            'text_hits': 0,
+            'text_misses': 0,
+            'bytes_downloaded': 0,
+            'evictions': 0,
+        }
+        self._load_index()
+        self._adopt_unindexed()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            print(f"  Resume cache index at {self.index_path} is unreadable, starting empty.")
+            return
+
+        self._urls = {url: UrlEntry.from_dict(entry) for url, entry in index.get('urls', {}).items()}
+        objects = index.get('objects', {})
+        for sha, meta in sorted(objects.items(), key=lambda kv: kv[1].get('last_access', 0)):
+            if not os.path.exists(self.pdf_path(sha)):
+                continue
+            self._objects[sha] = meta
+            self._total_bytes += meta.get('size', 0) + meta.get('text_size', 0)
+
+    def _adopt_unindexed(self):
+        """
+        Count PDFs a crashed run stored after its last index save.
+
+        Their URLs are lost, but they are added as the least recently used
+        objects so they stay under the size bound and are evicted first by
+        the next `store`. Nothing is deleted here, since another process
+        may be reading the cache.
+        """
+        pdf_dir = os.path.join(self.cache_dir, 'pdf')
+        if not os.path.isdir(pdf_dir):
+            return
+        orphans = []
+        for entry in os.scandir(pdf_dir):
+            sha, ext = os.path.splitext(entry.name)
+            if ext != '.pdf' or sha in self._objects:
+                continue
+            try:
+                text_size = os.path.getsize(self._text_path(sha))
+            except OSError:
+                text_size = 0
+            stat = entry.stat()
+            orphans.append((stat.st_mtime, sha, {'size': stat.st_size, 'text_size': text_size, 'last_access': stat.st_mtime}))
+        for _, sha, meta in sorted(orphans, reverse=True):
+            self._objects[sha] = meta
+            self._objects.move_to_end(sha, last=False)
+            self._total_bytes += meta['size'] + meta['text_size']
+        if orphans:
+            print(f"  Resume cache: adopted {len(orphans)} PDFs missing from the index.")
+
+    def _changed(self):
+        """Count an index change; returns True when the index is due to be saved."""
+        self._unsaved += 1
+        return bool(self.save_every) and self._unsaved >= self.save_every
+
+    def save(self):
+        """Persist the index atomically."""
+        with self._lock:
+            self._unsaved = 0
+            index = {'urls': {url: entry.to_dict() for url, entry in self._urls.items()}, 'objects': dict(self._objects)}
+            self._write_atomic(self.index_path, json.dumps(index).encode('utf-8'))
+
+    def pdf_path(self, sha):
+        """Path of the cached PDF, so parse workers can read it themselves."""
+        return os.path.join(self.cache_dir, 'pdf', sha + '.pdf')
+
+    def _text_path(self, sha):
+        return os.path.join(self.cache_dir, 'text', sha + '.txt')
+
+    @staticmethod
+    def _write_atomic(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _touch(self, sha):
+        meta = self._objects.get(sha)
+        if meta is None:
+            return False
+        meta['last_access'] = time.time()
+        self._objects.move_to_end(sha)
+        return True
+
+    def _evict(self):
+        excess = self._total_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for sha, meta in self._objects.items():
+            if excess <= 0 or len(self._objects) - len(victims) <= 1:
+                break
+            # A queued parse would find its PDF gone
+            if sha in self._pinned:
+                continue
+            victims.append(sha)
+            excess -= meta.get('size', 0) + meta.get('text_size', 0)
+        for sha in victims:
+            meta = self._objects.pop(sha)
+            self._total_bytes -= meta.get('size', 0) + meta.get('text_size', 0)
+            for path in (self.pdf_path(sha), self._text_path(sha)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.stats['evictions'] += 1
+        if victims:
+            evicted = set(victims)
+            self._urls = {url: entry for url, entry in self._urls.items() if entry.sha256 not in evicted}
+
+    def _pin(self, sha, pin):
+        if pin:
+            self._pinned[sha] += 1
+
+    def unpin(self, sha):
+        """Release a `pin=True` lookup, fetch or store once the PDF's text is in hand."""
+        with self._lock:
+            self._pinned[sha] -= 1
+            if self._pinned[sha] <= 0:
+                del self._pinned[sha]
+
+    def lookup(self, url, pin=False):
+        """
+        Return (sha, is_fresh) for a cached URL, or (None, False).
+
+        A fresh entry can be used without contacting the server; a stale one
+        should be revalidated with `conditional_headers`. With `pin`, a fresh
+        entry is kept from eviction until `unpin`.
+        """
+        with self._lock:
+            entry = self._urls.get(url)
+            if not entry or entry.sha256 not in self._objects:
+                return None, False
+            is_fresh = self.max_age is not None and time.time() - entry.fetched_at < self.max_age
+            if is_fresh:
+                self._touch(entry.sha256)
+                self._pin(entry.sha256, pin)
+                self.stats['fresh_hits'] += 1
+            return entry.sha256, is_fresh
+
+    def cached_hash(self, url):
+        """Content hash last seen for `url`, without touching the network or stats."""
+        with self._lock:
+            entry = self._urls.get(url)
+            return entry.sha256 if entry else None
+
+    def conditional_headers(self, url):
+        """Headers for a conditional GET against the cached copy of `url`."""
+        with self._lock:
+            entry = self._urls.get(url)
+            if not entry or entry.sha256 not in self._objects:
+                return {}
+            headers = {}
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+            return headers
+
+    def mark_not_modified(self, url, pin=False):
+        """Record a 304 response and return the cached hash, if still present."""
+        with self._lock:
+            entry = self._urls.get(url)
+            if not entry or not self._touch(entry.sha256):
+                return None
+            self._pin(entry.sha256, pin)
+            entry.fetched_at = time.time()
+            self.stats['revalidated'] += 1
+            return entry.sha256
+
+    def store(self, url, content, headers=None, pin=False):
+        """Store downloaded PDF bytes for `url` and return their hash."""
+        headers = headers or {}
+        sha = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            self.stats['downloads'] += 1
+            self.stats['bytes_downloaded'] += len(content)
+            if sha not in self._objects:
+                self._write_atomic(self.pdf_path(sha), content)
+                self._objects[sha] = {'size': len(content), 'text_size': 0}
+                self._total_bytes += len(content)
+            self._touch(sha)
+            self._pin(sha, pin)
+            self._urls[url] = UrlEntry(sha, headers.get('ETag'), headers.get('Last-Modified'), time.time())
+            self._evict()
+            due = self._changed()
+        if due:
+            self.save()
+        return sha
+
+    def read_text(self, sha):
+        """Return cached extracted text for a PDF hash, or None."""
+        try:
+            with open(self._text_path(sha), 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.stats['text_misses'] += 1
+            return None
+        with self._lock:
+            self.stats['text_hits'] += 1
+            self._touch(sha)
+        return text
+
+    def write_text(self, sha, text):
+        data = text.encode('utf-8')
+        self._write_atomic(self._text_path(sha), data)
+        with self._lock:
+            meta = self._objects.get(sha)
+            if meta is not None:
+                self._total_bytes += len(data) - meta.get('text_size', 0)
+                meta['text_size'] = len(data)
+                self._evict()
+            due = self._changed()
+        if due:
+            self.save()
+
+    def fetch(self, url, headers=None, timeout=30, session=None, pin=False):
+        """
+        Return the content hash for `url`, downloading only when needed.
+
+        Fresh entries are served from disk, stale ones are revalidated with a
+        conditional GET and anything else is downloaded and stored. With
+        `pin`, the object is kept from eviction until `unpin`.
+        """
+        sha, is_fresh = self.lookup(url, pin)
+        if is_fresh:
+            return sha
+
+        request_headers = dict(headers or {})
+        request_headers.update(self.conditional_headers(url))
+        http = session or requests
+        with metrics.timer('download_seconds'):
+            response = http.get(url, headers=request_headers, timeout=timeout)
+            if response.status_code == 304:
+                sha = self.mark_not_modified(url, pin)
+                if sha:
+                    return sha
+                # Evicted between the lookup and the response, fetch it again
+                response = http.get(url, headers=headers, timeout=timeout)
+            response.raise_for_status()
+            content = response.content
+        return self.store(url, content, response.headers, pin)
+
+    def export_metrics(self):
+        """Copy the cache counters into the run metrics."""
+        s = self.stats
+        metrics.inc('downloads_total', s['fresh_hits'], result='fresh')
+        metrics.inc('downloads_total', s['revalidated'], result='revalidated')
+        metrics.inc('downloads_total', s['downloads'], result='downloaded')
+        metrics.inc('download_bytes_total', s['bytes_downloaded'])
+        metrics.inc('text_cache_total', s['text_hits'], result='hit')
+        metrics.inc('text_cache_total', s['text_misses'], result='miss')
+        metrics.set_gauge('cache_bytes', self._total_bytes)
+
+    def report(self):
+        s = self.stats
+        print("Resume cache stats:")
+        print(f"  Served fresh from cache: {s['fresh_hits']}")
+        print(f"  Revalidated (304): {s['revalidated']}")
+        print(f"  Downloaded: {s['downloads']} ({s['bytes_downloaded'] / (1024 * 1024):.1f} MB)")
+        print(f"  Extracted text hits/misses: {s['text_hits']}/{s['text_misses']}")
+        print(f"  Evictions: {s['evictions']}")
+        print(f"  Cache size: {self._total_bytes / (1024 * 1024):.1f} MB in {len(self._objects)} objects")
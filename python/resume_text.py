@@ -0,0 +1,187 @@
+import re
+from threading import Lock
+
+# parse_pdf_text separates pages with this so repeated headers/footers can be found
+PAGE_BREAK = '\f'
+# Characters of resume text sent per analysis; roughly 3k tokens. 0 disables the cap
+MAX_TEXT_CHARS = 12000
+# Lines this close to the top or bottom of a page are header/footer candidates
+EDGE_LINES = 2
+TRUNCATION_MARK = '[...]'
+
+_SPACES = re.compile(r'[ \t\u00a0\u2000-\u200b\u3000]+')
+_CONTROL = re.compile(r'[\x00-\x08\x0b\x0e-\x1f\x7f\ufeff]')
+_PAGE_NUMBER = re.compile(
+    r'^(?:page\s*\d{1,3}(?:\s*(?:/|of)\s*\d{1,3})?|[-–(]?\s*\d{1,3}\s*[-–)]?|\d{1,3}\s*(?:/|of)\s*\d{1,3})$',
+    re.IGNORECASE,
+)
+
+# Sections are kept in this order when a resume is over budget; anything
+# under a heading that is not listed here ranks after all of them
+SECTION_PRIORITY = ['experience', 'skills', 'preamble', 'projects', 'summary', 'education', 'achievements']
+_HEADINGS = [
+    ('experience', r'(work |professional |relevant )?experience|employment( history)?|work history|career history|internships?'),
+    ('skills', r'(technical |key |core )?skills( & tools| and tools)?|technologies|tools|tech stack|core competencies|expertise'),
+    ('projects', r'(academic |personal |key )?projects'),
+    ('summary', r'(professional |career )?summary|profile|objective|about me'),
+    ('education', r'education|academics?|qualifications?'),
+    ('achievements', r'achievements|awards|certifications?|accomplishments'),
+    ('other', r'hobbies|interests|languages|declaration|references|personal (details|information)|extra[- ]curricular.*'),
+]
+_HEADING = re.compile(
+    r'^(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in _HEADINGS) + r')\s*:?$',
+    re.IGNORECASE,
+)
+
+
+def _clean_line(line):
+    return _SPACES.sub(' ', _CONTROL.sub('', line)).strip()
+
+
+def _line_key(line):
+    # "Page 2 of 4" and "Page 3 of 4" count as the same footer
+    return re.sub(r'\d+', '#', line.lower())
+
+
+def _edges(lines):
+    """Keys of the first and last few non-blank lines of a page, by position."""
+    content = [line for line in lines if line]
+    # Too short to tell a header from the body
+    if len(content) <= 2 * EDGE_LINES:
+        return set()
+    return ({('top', _line_key(line)) for line in content[:EDGE_LINES]}
+            | {('bottom', _line_key(line)) for line in content[-EDGE_LINES:]})
+
+
+def drop_repeated_lines(pages):
+    """Remove header/footer lines that repeat on most pages, and bare page numbers."""
+    repeated = set()
+    if len(pages) > 1:
+        seen_on = {}
+        for lines in pages:
+            for key in _edges(lines):
+                seen_on[key] = seen_on.get(key, 0) + 1
+        threshold = max(2, (len(pages) + 1) // 2)
+        repeated = {key for key, pages_seen in seen_on.items() if pages_seen >= threshold}
+
+    kept = []
+    for lines in pages:
+        content = [index for index, line in enumerate(lines) if line]
+        top = set(content[:EDGE_LINES])
+        bottom = set(content[-EDGE_LINES:])
+        for index, line in enumerate(lines):
+            if index in top or index in bottom:
+                if _PAGE_NUMBER.match(line):
+                    continue
+                key = _line_key(line)
+                if (index in top and ('top', key) in repeated) or (index in bottom and ('bottom', key) in repeated):
+                    continue
+            kept.append(line)
+    return kept
+
+
+def normalize_text(text):
+    """Collapse whitespace, drop control characters and repeated page headers/footers."""
+    pages = [[_clean_line(line) for line in page.splitlines()] for page in text.split(PAGE_BREAK)]
+    lines = drop_repeated_lines(pages)
+
+    # At most one blank line in a row, none at the ends
+    out = []
+    for line in lines:
+        if line or (out and out[-1]):
+            out.append(line)
+    while out and not out[-1]:
+        out.pop()
+    return '\n'.join(out)
+
+
+def split_sections(text):
+    """Split normalized text into (kind, text) sections at recognizable headings."""
+    sections = []
+    kind, lines = 'preamble', []
+    for line in text.split('\n'):
+        match = _HEADING.match(line) if len(line) <= 40 else None
+        if match:
+            if lines:
+                sections.append((kind, '\n'.join(lines)))
+            kind, lines = match.lastgroup, []
+        lines.append(line)
+    if lines:
+        sections.append((kind, '\n'.join(lines)))
+    return sections
+
+
+def _cut(text, budget):
+    """Cut text to at most `budget` characters, at a line boundary where possible."""
+    budget -= len(TRUNCATION_MARK) + 1
+    if budget <= 0:
+        return ''
+    cut = text.rfind('\n', 0, budget + 1)
+    if cut < budget // 2:
+        cut = budget
+    return text[:cut].rstrip() + '\n' + TRUNCATION_MARK
+
+
+def truncate_text(text, max_chars):
+    """
+    Fit text into `max_chars`, spending the budget on the most useful sections.
+
+    Whole sections are kept in SECTION_PRIORITY order until the budget runs
+    out, the next one is cut short, and the rest are dropped. Kept sections
+    stay in their original order.
+    """
+    if not max_chars or len(text) <= max_chars:
+        return text
+    sections = split_sections(text)
+    rank = {kind: position for position, kind in enumerate(SECTION_PRIORITY)}
+    order = sorted(range(len(sections)), key=lambda i: (rank.get(sections[i][0], len(rank)), i))
+
+    kept = {}
+    remaining = max_chars
+    for i in order:
+        # One newline joins each kept section to the previous one
+        section = sections[i][1]
+        cost = len(section) + (1 if kept else 0)
+        if cost <= remaining:
+            kept[i] = section
+            remaining -= cost
+        else:
+            section = _cut(section, remaining - (1 if kept else 0))
+            if section:
+                kept[i] = section
+            break
+    return '\n'.join(kept[i] for i in sorted(kept))
+
+
+class TextPrefilter:
+    """
+    Shrinks raw pypdf text before it is sent for analysis.
+
+    Deterministic: the same input always gives the same output, so cached
+    text and re-runs produce identical requests. Keeps running totals of
+    characters in and out for the end-of-run report.
+    """
+
+    def __init__(self, max_chars=MAX_TEXT_CHARS):
+        self.max_chars = max_chars
+        self._lock = Lock()
+        self.stats = {'resumes': 0, 'raw_chars': 0, 'sent_chars': 0, 'truncated': 0}
+
+    def apply(self, text):
+        normalized = normalize_text(text)
+        filtered = truncate_text(normalized, self.max_chars)
+        with self._lock:
+            self.stats['resumes'] += 1
+            self.stats['raw_chars'] += len(text)
+            self.stats['sent_chars'] += len(filtered)
+            if filtered is not normalized:
+                self.stats['truncated'] += 1
+        return filtered
+
+    def report(self):
+        s = self.stats
+        if not s['resumes']:
+            return
+        saved = 100 * (1 - s['sent_chars'] / s['raw_chars']) if s['raw_chars'] else 0
+        print(f"Resume text: {s['raw_chars']} chars extracted, {s['sent_chars']} sent for analysis "
+              f"({saved:.0f}% smaller), {s['truncated']} of {s['resumes']} resumes truncated")
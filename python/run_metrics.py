@@ -0,0 +1,267 @@
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+
+# Prometheus-style upper bounds, in seconds, for latency histograms
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Observations kept per histogram series for percentiles
+RESERVOIR_SIZE = 10000
+# Seconds between queue depth / concurrency samples
+SAMPLE_INTERVAL = 1.0
+
+
+class Histogram:
+    """Bucket counts for Prometheus plus a fixed-size random sample for percentiles."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max', 'reservoir', '_random')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+        self.reservoir = []
+        self._random = random.Random(0)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+        # Reservoir sampling keeps every observation equally likely to be kept
+        if len(self.reservoir) < RESERVOIR_SIZE:
+            self.reservoir.append(value)
+        else:
+            slot = self._random.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self.reservoir[slot] = value
+
+    def percentile(self, q):
+        if not self.reservoir:
+            return None
+        ordered = sorted(self.reservoir)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_text(key):
+    return ','.join(f'{name}={value}' for name, value in key)
+
+
+def _prometheus_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and histograms for one run.
+
+    Series are identified by a name plus keyword labels, e.g.
+    `metrics.observe('webhook_seconds', 1.2, outcome='ok')`. At the end of a
+    run `write_json` produces the run report and `write_prometheus` a file
+    for the node_exporter textfile collector.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.stage_workers = {}
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc)
+        self._samplers = []
+
+    def start(self):
+        """Restart the run clock; call when the run begins."""
+        with self._lock:
+            self.started = time.monotonic()
+            self.started_at = datetime.now(timezone.utc)
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges.setdefault(name, {})[_key(labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            key = _key(labels)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def register_stage(self, name, workers):
+        """Record a pipeline stage's worker count, for utilization in the report."""
+        with self._lock:
+            self.stage_workers[name] = workers
+
+    def start_sampler(self, name, sample, interval=SAMPLE_INTERVAL, buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500)):
+        """
+        Call `sample()` every `interval` seconds in a background thread.
+
+        It returns {label value: number}, e.g. queue depth per stage, and each
+        number is recorded in the `name` histogram labelled by `series`.
+        """
+        stop = Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    values = sample()
+                except Exception:
+                    continue
+                for series, value in values.items():
+                    self.observe(name, value, buckets=buckets, series=series)
+
+        thread = Thread(target=run, name=f"sampler-{name}", daemon=True)
+        thread.start()
+        self._samplers.append((stop, thread))
+
+    def stop_samplers(self):
+        for stop, thread in self._samplers:
+            stop.set()
+            thread.join()
+        self._samplers = []
+
+    def _stages(self, wall):
+        busy = self.counters.get('stage_busy_seconds', {})
+        items = self.counters.get('stage_items_total', {})
+        depths = self.histograms.get('queue_depth', {})
+        stages = {}
+        for name, workers in self.stage_workers.items():
+            key = (('stage', name),)
+            seconds = busy.get(key, 0.0)
+            depth = depths.get((('series', name),))
+            stages[name] = {
+                'workers': workers,
+                'items': items.get(key, 0),
+                'busy_seconds': round(seconds, 3),
+                # Share of the stage's worker time spent handling items
+                'utilization': round(seconds / (workers * wall), 3) if workers and wall else None,
+                'queue_depth_mean': round(depth.sum / depth.count, 2) if depth and depth.count else None,
+                'queue_depth_max': depth.max if depth else None,
+            }
+        return stages
+
+    def snapshot(self):
+        with self._lock:
+            wall = time.monotonic() - self.started
+            stages = self._stages(wall)
+            report = {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'finished_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'wall_seconds': round(wall, 3),
+                'counters': {name: {_label_text(key): value for key, value in series.items()}
+                             for name, series in self.counters.items()},
+                'gauges': {name: {_label_text(key): value for key, value in series.items()}
+                           for name, series in self.gauges.items()},
+                'histograms': {name: {_label_text(key): histogram.summary() for key, histogram in series.items()}
+                               for name, series in self.histograms.items()},
+                'stages': stages,
+            }
+        # The busiest stage is the one holding the run back
+        busiest = max(stages.items(), key=lambda item: item[1]['utilization'] or 0, default=None)
+        report['bottleneck'] = busiest[0] if busiest and busiest[1]['utilization'] else None
+        return report
+
+    def write_json(self, path, **extra):
+        """Write the run report, with `extra` fields (engine, options, ...) at the top."""
+        report = dict(extra)
+        report.update(self.snapshot())
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        os.replace(tmp_path, path)
+        return report
+
+    def write_prometheus(self, path, prefix='ark_hr_'):
+        """Write every series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metric = prefix + name
+                lines.append(f'# TYPE {metric} counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{metric}{_prometheus_labels(key)} {value}')
+            for name, series in sorted(self.gauges.items()):
+                metric = prefix + name
+                lines.append(f'# TYPE {metric} gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{metric}{_prometheus_labels(key)} {value}')
+            for name, series in sorted(self.histograms.items()):
+                metric = prefix + name
+                lines.append(f'# TYPE {metric} histogram')
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{_prometheus_labels(key, [("le", bound)])} {cumulative}')
+                    lines.append(f'{metric}_bucket{_prometheus_labels(key, [("le", "+Inf")])} {histogram.count}')
+                    lines.append(f'{metric}_sum{_prometheus_labels(key)} {histogram.sum}')
+                    lines.append(f'{metric}_count{_prometheus_labels(key)} {histogram.count}')
+        # Written then renamed so the collector never reads a partial file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+    def report(self):
+        """Print the headline numbers of the run."""
+        snapshot = self.snapshot()
+        print(f"Run metrics ({snapshot['wall_seconds']:.1f}s wall):")
+        for name, series in sorted(snapshot['histograms'].items()):
+            if name == 'queue_depth':
+                continue
+            for labels, s in sorted(series.items()):
+                label = f"{name}{{{labels}}}" if labels else name
+                print(f"  {label}: n={s['count']} mean={s['mean']:.3f} p50={s['p50']:.3f} "
+                      f"p90={s['p90']:.3f} p99={s['p99']:.3f} max={s['max']:.3f}")
+        for name, stage in snapshot['stages'].items():
+            print(f"  stage {name}: {stage['items']} items, {stage['workers']} workers, "
+                  f"utilization {stage['utilization']}, queue depth max {stage['queue_depth_max']}")
+        if snapshot['bottleneck']:
+            print(f"  Busiest stage: {snapshot['bottleneck']}")
+
+
+# Shared by every module of one run, like a logger
+metrics = Metrics()
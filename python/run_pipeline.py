@@ -0,0 +1,447 @@
+import argparse
+import json
+import os
+import queue
+import signal
+import time
+from datetime import datetime, timezone
+from itertools import chain
+from threading import Event, Thread
+
+import get_data
+import process_applications as processing
+from checkpoint_store import CheckpointStore
+from dedupe_index import MATCH_MODES
+from local_extract import EXTRACT_MODES
+from records import iter_records
+from resume_text import MAX_TEXT_CHARS
+from run_metrics import metrics
+
+# Records buffered between two stages; a slow stage blocks the one feeding it
+QUEUE_SIZE = 1000
+# Upload a partly filled batch once no new results have come in for this long
+MIGRATE_FLUSH_AFTER = 2.0
+EXPORT_FORMATS = ['xlsx', 'parquet', 'feather']
+EXCEL_FILE = 'processed_applications.xlsx'
+
+# Seconds between checks for a stop request or an idle queue
+TICK = 0.5
+# Seconds between WordPress polls in --watch mode
+WATCH_INTERVAL = 60
+HEALTH_FILE = 'pipeline_health.json'
+# Health turns 'stale' after this many poll intervals without a successful poll
+STALE_AFTER_POLLS = 3
+# Health turns 'lagging' once a fetched application has waited this long to be stored
+LAG_ALERT_SECONDS = 15 * 60
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+def iter_queue(q, flush_after=None, flush_marker=None, stop=None):
+    """
+    Yield items from `q` until the end marker, or until `stop` is set.
+
+    With `flush_after`, `flush_marker` is yielded once the queue has been idle
+    that long after an item, so consumers can act on what they have.
+    """
+    last_item = None
+    while not (stop and stop.is_set()):
+        ticking = stop is not None or last_item is not None
+        try:
+            item = q.get(timeout=TICK if ticking else None)
+        except queue.Empty:
+            if last_item is not None and time.monotonic() - last_item >= flush_after:
+                last_item = None
+                yield flush_marker
+            continue
+        if item is _DONE:
+            return
+        if flush_after is not None:
+            last_item = time.monotonic()
+        yield item
+
+
+def put_while_alive(q, item, consumer):
+    """Put `item` on `q` unless `consumer` has died, so a failed stage cannot block its producer forever."""
+    while consumer.is_alive():
+        try:
+            q.put(item, timeout=TICK)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def put_until(q, item, stop):
+    """Put `item` on `q`, giving up once `stop` is set. Returns whether it was queued."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=TICK)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class StageThread(Thread):
+    """Runs one stage in a thread and keeps its exception for the orchestrator."""
+
+    def __init__(self, name, target, *args):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self._args = args
+        self.error = None
+
+    def run(self):
+        try:
+            self._target_fn(*self._args)
+        except Exception as e:
+            print(f"Error in {self.name} stage: {e}")
+            self.error = e
+
+
+class Watch:
+    """
+    State of a --watch run: the stop signal, poll bookkeeping and health.
+
+    The health file is rewritten after every poll. It holds the time of the
+    last successful poll, how many fetched applications are not stored yet
+    and how long the oldest of them has been waiting (the lag). `status` is
+    'stopped' once shutdown has begun, 'failed' when a stage thread has died, 'stale' when no poll has
+    succeeded for STALE_AFTER_POLLS intervals, 'lagging' when the lag passes
+    LAG_ALERT_SECONDS and 'ok' otherwise, so a health check only has to read
+    one field (and `checked_at`, in case the process itself is stuck).
+    """
+
+    def __init__(self, interval, health_file, prometheus_file, fetched_at):
+        self.interval = interval
+        self.health_file = health_file
+        self.prometheus_file = prometheus_file
+        self.fetched_at = fetched_at
+        self.stop = Event()
+        self.stages = []
+        self.started = time.time()
+        self.last_success = None
+        self.last_error = None
+
+    def poll_finished(self, error=None):
+        if error is None:
+            self.last_success = time.time()
+            metrics.inc('polls_total', result='ok')
+        else:
+            self.last_error = str(error)
+            metrics.inc('polls_total', result='error')
+        self.write_health()
+
+    def health(self):
+        now = time.time()
+        # Copied first; other stages add and remove entries meanwhile
+        waiting_since = self.fetched_at.copy().values()
+        lag = time.monotonic() - min(waiting_since) if waiting_since else 0.0
+        since_success = now - (self.last_success or self.started)
+        # Stages also exit cleanly on a graceful stop; only an exception is a failure
+        failed = [stage.name for stage in self.stages if stage.error]
+        if self.stop.is_set():
+            status = 'stopped'
+        elif failed:
+            status = 'failed'
+        elif since_success > STALE_AFTER_POLLS * self.interval:
+            status = 'stale'
+        elif lag > LAG_ALERT_SECONDS:
+            status = 'lagging'
+        else:
+            status = 'ok'
+        return {
+            'status': status,
+            'checked_at': datetime.fromtimestamp(now, timezone.utc).isoformat(timespec='seconds'),
+            'last_success_at': (datetime.fromtimestamp(self.last_success, timezone.utc).isoformat(timespec='seconds')
+                                if self.last_success else None),
+            'last_error': self.last_error,
+            'pending_applications': len(waiting_since),
+            'lag_seconds': round(lag, 1),
+            'failed_stages': failed,
+        }
+
+    def write_health(self):
+        health = self.health()
+        metrics.set_gauge('pending_applications', health['pending_applications'])
+        metrics.set_gauge('lag_seconds', health['lag_seconds'])
+        metrics.set_gauge('healthy', int(health['status'] == 'ok'))
+        tmp_path = self.health_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(health, f, indent=4)
+        os.replace(tmp_path, self.health_file)
+        if self.prometheus_file:
+            metrics.write_prometheus(self.prometheus_file)
+        return health
+
+
+def watermark_path(fetch_store):
+    """File next to the fetched applications holding the date the last complete poll reached."""
+    base, _ = os.path.splitext(fetch_store.output_file)
+    return base + '.watermark.json'
+
+
+def load_watermark(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('after')
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"  Could not read the fetch watermark {path}: {e}")
+        return None
+
+
+def save_watermark(path, date):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'after': date}, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_stage(fetch_store, processed_ids, out, workers, fetched_at, stop, watch=None):
+    """
+    Queue fetched applications that still need processing.
+
+    Applications fetched by an earlier run but never processed go first,
+    then everything WordPress has that is newer than the watermark. New
+    records are checkpointed to the fetch log before they are queued. The
+    watermark only moves once a whole poll has been read, so a page that
+    failed is asked for again, and each poll starts a little before it and
+    skips applications already fetched.
+    Fetching ends early once `stop` is set. With `watch`, WordPress is polled
+    again every `watch.interval` seconds until then, and a failed poll is
+    retried on the next one.
+    """
+    try:
+        watermark_file = watermark_path(fetch_store)
+        watermark = load_watermark(watermark_file)
+        newest_on_disk = None
+        known_ids = set()
+        backlog = 0
+        for app in fetch_store.iter_processed():
+            known_ids.add(app['id'])
+            if newest_on_disk is None or app['date'] > newest_on_disk:
+                newest_on_disk = app['date']
+            if app['id'] not in processed_ids:
+                fetched_at[app['id']] = time.monotonic()
+                if not put_until(out, app, stop):
+                    return
+                backlog += 1
+        print(f"Queued {backlog} fetched but unprocessed applications.")
+        if watermark is None:
+            # Fetch logs from before the watermark file; the overlap re-reads the edge
+            watermark = newest_on_disk
+
+        while True:
+            after = get_data.overlap_start(watermark)
+            print(f"Fetching applications after {after}...")
+            newest = watermark
+            try:
+                for record in get_data.fetch_all(after=after, workers=workers):
+                    if stop.is_set():
+                        return
+                    if newest is None or record['date'] > newest:
+                        newest = record['date']
+                    # The overlap, earlier partial polls and shifting pages all repeat records
+                    if record['id'] in known_ids:
+                        continue
+                    known_ids.add(record['id'])
+                    fetch_store.append(record)
+                    metrics.inc('applications_fetched_total')
+                    if record['id'] not in processed_ids:
+                        fetched_at[record['id']] = time.monotonic()
+                        if not put_until(out, record, stop):
+                            return
+            except Exception as e:
+                if not watch:
+                    raise
+                print(f"Poll failed, retrying in {watch.interval}s: {e}")
+                watch.poll_finished(e)
+            else:
+                if newest != watermark:
+                    watermark = newest
+                    save_watermark(watermark_file, watermark)
+                if watch:
+                    watch.poll_finished()
+            if not watch or stop.wait(watch.interval):
+                return
+    finally:
+        put_until(out, _DONE, stop)
+
+
+def migrate_stage(sync, processed_file, results):
+    """Upsert earlier results that never made it to the database, then new ones as they come."""
+    from migrate_applicants import FLUSH
+    sync.run(chain(iter_records(processed_file), iter_queue(results, MIGRATE_FLUSH_AFTER, FLUSH)))
+
+
+def export(formats):
+    for file_format in formats:
+        if file_format == 'xlsx':
+            from convert_to_excel import convert_json_to_excel
+            convert_json_to_excel(processing.OUTPUT_FILE, EXCEL_FILE)
+        else:
+            from convert_to_parquet import convert_json_to_dataset
+            convert_json_to_dataset(processing.OUTPUT_FILE, f"processed_applications_{file_format}", file_format)
+
+
+def install_stop_handler(stop):
+    """The first SIGINT/SIGTERM asks for a graceful stop; a second one aborts."""
+    def handle(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        print("Stopping: finishing the applications in flight (repeat the signal to abort)...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+
+def main(engine='threads', batch_size=0, dedupe_mode='resume', max_text_chars=MAX_TEXT_CHARS, local_mode='off',
+         migrate=True, export_formats=None, fetch_workers=get_data.FETCH_WORKERS,
+         report_file=processing.RUN_REPORT_FILE, prometheus_file=None,
+         watch_interval=None, health_file=HEALTH_FILE, priority=None, retry_failed=False):
+    """
+    Fetch, process, migrate and export in one streaming run.
+
+    The stages run at the same time and hand records on through bounded
+    queues, so an application is analyzed and upserted as soon as it is
+    fetched rather than after the whole fetch. Each stage checkpoints
+    separately: the fetch log next to fetched_applications.json, the
+    processing log next to processed_applications.json and the migration
+    manifest. A rerun picks up whatever an interrupted run left at any stage.
+    Exports are written once at the end from the compacted results.
+
+    With `watch_interval` the run keeps polling WordPress for new
+    applications until it gets SIGINT or SIGTERM. It then stops fetching,
+    finishes and upserts the applications already being processed, saves
+    every checkpoint and exits; applications fetched but not started yet
+    are in the fetch log and go first on the next start. Watch runs do not
+    export unless `export_formats` is given.
+
+    `priority` and `retry_failed` work as in process_applications.main.
+    """
+    if export_formats is None:
+        export_formats = [] if watch_interval else ['xlsx']
+    processing.text_prefilter.max_chars = max_text_chars
+    processing.local_extractor.mode = local_mode
+    metrics.start()
+
+    fetch_store = CheckpointStore(processing.INPUT_FILE, compact_every=processing.COMPACT_EVERY, fsync=False)
+    store = CheckpointStore(processing.OUTPUT_FILE, compact_every=processing.COMPACT_EVERY)
+    # Later stages read the output files while the run appends to the logs
+    fetch_store.compact()
+    store.compact()
+    processed_ids = store.load_processed_ids()
+    if retry_failed:
+        failed_ids = store.load_failed_ids()
+        processed_ids -= failed_ids
+        print(f"Retrying {len(failed_ids)} applications that failed before.")
+        if priority:
+            priority.retry_ids = failed_ids
+    # Monotonic fetch time of each application not stored yet, for the ingest latency and lag
+    fetched_at = {}
+    watch = Watch(watch_interval, health_file, prometheus_file, fetched_at) if watch_interval else None
+    stop = watch.stop if watch else Event()
+    install_stop_handler(stop)
+
+    sync = None
+    if migrate:
+        from migrate_applicants import ApplicantSync
+
+        def record_stored(batch):
+            now = time.monotonic()
+            for row in batch:
+                start = fetched_at.pop(row['id'], None)
+                if start is not None:
+                    metrics.observe('ingest_seconds', now - start)
+
+        sync = ApplicantSync(on_stored=record_stored, on_failed=lambda row: fetched_at.pop(row['id'], None))
+        if not sync.prepare():
+            return
+
+    fetched = queue.Queue(maxsize=QUEUE_SIZE)
+    results = queue.Queue(maxsize=QUEUE_SIZE)
+    fetcher = StageThread('fetch', fetch_stage, fetch_store, processed_ids, fetched, fetch_workers, fetched_at, stop,
+                          watch)
+    fetcher.start()
+    migrator = None
+    if sync:
+        migrator = StageThread('migrate', migrate_stage, sync, processing.OUTPUT_FILE, results)
+        migrator.start()
+    if watch:
+        watch.stages = [stage for stage in (fetcher, migrator) if stage]
+
+    def save_result(result):
+        store.append(result)
+        processed_ids.add(result['id'])
+        metrics.inc('applications_total', outcome=processing.result_outcome(result))
+        if not (migrator and put_while_alive(results, result, migrator)):
+            fetched_at.pop(result['id'], None)
+
+    if watch:
+        print(f"Watching for new applications every {watch_interval}s with the {engine} engine; health in {health_file}")
+    else:
+        print(f"Starting streaming run with the {engine} engine...")
+    try:
+        processing.process_stream(iter_queue(fetched, stop=stop), save_result, store, engine=engine,
+                                  batch_size=batch_size, dedupe_mode=dedupe_mode, priority=priority, stop=stop)
+        interrupted = stop.is_set() and not watch
+        # Ends the fetch stage too if processing stopped early
+        stop.set()
+        fetcher.join()
+    finally:
+        if migrator:
+            put_while_alive(results, _DONE, migrator)
+            migrator.join()
+        fetch_store.close()
+        store.close()
+
+    if sync:
+        print("Migration summary:")
+        sync.report()
+    if watch:
+        watch.write_health()
+    failed = [stage for stage in (fetcher, migrator) if stage and stage.error]
+    if failed:
+        print(f"Skipping export: the {', '.join(stage.name for stage in failed)} stage failed. "
+              "Everything checkpointed so far is picked up by the next run.")
+    elif interrupted and export_formats:
+        print("Skipping export: the run was stopped early.")
+    elif export_formats:
+        export(export_formats)
+
+    processing.write_run_report(report_file, prometheus_file, engine=engine, batch_size=batch_size,
+                                dedupe=dedupe_mode, max_text_chars=max_text_chars, local_extract=local_mode,
+                                migrate=migrate, export=list(export_formats), watch_interval=watch_interval)
+    print("Pipeline complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch, process, migrate and export applications as one streaming pipeline.")
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads')
+    parser.add_argument('--batch-size', type=int, default=0, help="Resumes per webhook request")
+    parser.add_argument('--dedupe', choices=sorted(MATCH_MODES), default='resume')
+    parser.add_argument('--max-text-chars', type=int, default=MAX_TEXT_CHARS)
+    parser.add_argument('--local-extract', choices=list(EXTRACT_MODES), default='off')
+    parser.add_argument('--fetch-workers', type=int, default=get_data.FETCH_WORKERS, help="Pages fetched concurrently")
+    parser.add_argument('--no-migrate', action='store_true', help="Do not upsert into the applicants table")
+    parser.add_argument('--export', nargs='*', choices=EXPORT_FORMATS, default=None,
+                        help="Formats written at the end (default: xlsx, or none with --watch)")
+    parser.add_argument('--report', default=processing.RUN_REPORT_FILE)
+    parser.add_argument('--prometheus', default=None, help="Prometheus textfile, rewritten after every poll in --watch mode")
+    parser.add_argument('--watch', action='store_true', help="Keep polling for new applications until SIGINT/SIGTERM")
+    parser.add_argument('--interval', type=int, default=WATCH_INTERVAL, help="Seconds between polls with --watch")
+    parser.add_argument('--health-file', default=HEALTH_FILE)
+    processing.add_priority_arguments(parser)
+    args = parser.parse_args()
+    main(engine=args.engine, batch_size=args.batch_size, dedupe_mode=args.dedupe,
+         max_text_chars=args.max_text_chars, local_mode=args.local_extract, migrate=not args.no_migrate,
+         export_formats=args.export, fetch_workers=args.fetch_workers,
+         report_file=args.report, prometheus_file=args.prometheus,
+         watch_interval=args.interval if args.watch else None, health_file=args.health_file,
+         priority=processing.priority_from_args(args), retry_failed=args.retry_failed)